@@ -35,8 +35,12 @@ class CDiscQAgent(LFAControlAgent):
 
 
     def _update_weights(self, reward, obs, term_flag):
-        past_sa = self._get_representation(self.past_obs, self.past_action)
-        prediction = self._get_linear_value_approximation(past_sa)
+        # only the weights of the past action are involved in the update
+        past_weights = self.weights_matrix[self.past_action]
+        if self.tilecoder:
+            prediction = past_weights[self.past_obs].sum()
+        else:
+            prediction = past_weights @ self.past_obs
         
         # compute the target
         if not term_flag:
@@ -57,11 +61,49 @@ class CDiscQAgent(LFAControlAgent):
             self.avg_reward += self.beta * avg_rew_delta
             updated_delta = delta
 
-        # update the value estimates
+        self._update_value_estimates(updated_delta)
+
+    def _replay_update(self, obs, actions, rewards, next_obs, terms):
+        """
+        Applies the average of the one-step CDiscQ updates of a batch of
+        stored transitions, all computed with the current weights. Only the
+        weights are updated; the reward-rate estimate is learned from real
+        experience only.
+
+        Returns:
+            deltas: the TD errors of the transitions before the update
+        """
         if self.tilecoder:
-            self.weights[past_sa] += self.alpha * updated_delta
+            predictions = self.weights_matrix[actions[:, np.newaxis], obs].sum(axis=1)
+            q_next = self.weights_matrix[:, next_obs].sum(axis=2).max(axis=0)
+        else:
+            predictions = np.einsum('bf,bf->b', self.weights_matrix[actions], obs)
+            q_next = (next_obs @ self.weights_matrix.T).max(axis=1)
+
+        targets = rewards - self.avg_reward + self.gamma * np.where(terms, 0.0, q_next)
+        deltas = targets - predictions
+        step = self.alpha / actions.size * deltas
+
+        # np.add.at accumulates the updates of transitions that share weights
+        if self.tilecoder:
+            np.add.at(self.weights_matrix, (actions[:, np.newaxis], obs), step[:, np.newaxis])
+        else:
+            np.add.at(self.weights_matrix, actions, step[:, np.newaxis] * obs)
+
+        return deltas
+
+    def _update_value_estimates(self, delta):
+        """Moves the value of the past state-action pair along the TD error."""
+        past_weights = self.weights_matrix[self.past_action]
+        if self.tilecoder and self.tilecoder.hashed:
+            # hashed tiles of one observation may share an index, whose feature
+            # (and gradient) is then the number of tiles in it, as in _replay_update
+            np.add.at(past_weights, self.past_obs, self.alpha * delta)
+        elif self.tilecoder:
+            past_weights[self.past_obs] += self.alpha * delta
         else:
-            self.weights += self.alpha * updated_delta * past_sa
+            np.multiply(self.past_obs, self.alpha * delta, out=self._update_buffer)
+            past_weights += self._update_buffer
 
     def _initialize_step_size(self):
         """Initializes both the step sizes."""
@@ -84,6 +126,231 @@ class CDiscQAgent(LFAControlAgent):
             self.beta = self.beta_init / self.update_count if self.skip_exploratory_update else self.beta_init / self.timestep
 
 
+class BatchCDiscQAgent(CDiscQAgent):
+    """
+    Runs num_runs independent copies of CDiscQ in lockstep.
+
+    The weights are stored as a [num_runs, num_actions, num_features] array,
+    and the step sizes, epsilon and the reward-rate estimate are arrays with
+    one entry per run, so a single call to start or step updates all the
+    runs with NumPy operations. The runs share one random-number generator,
+    so they are statistically independent but not bit-identical to the runs
+    of num_runs separate CDiscQAgents.
+
+    start and step take (and return) arrays with one row per run.
+    """
+    # experiment.py steps all the runs of a batched agent together
+    batched = True
+
+    def __init__(self, **agent_args):
+        # needed before the base class sets the weights
+        assert 'num_runs' in agent_args
+        self.num_runs = agent_args['num_runs']
+        self.runs = np.arange(self.num_runs)
+        super().__init__(**agent_args)
+
+        self.avg_reward = np.full(self.num_runs, self.avg_reward_init, dtype=float)
+        self.epsilon = np.full(self.num_runs, self.epsilon_start, dtype=float)
+        self.update_count = np.ones(self.num_runs, dtype=int)
+        self.exploratory_action = np.zeros(self.num_runs, dtype=bool)
+
+        # same double-buffering as the single-run agent, one row per run
+        if self.tilecoder:
+            self._obs_buffers = np.empty((2, self.num_runs, self.num_tilings + 1), dtype=int)
+            self._obs_buffers[..., -1] = self.num_features - 1
+        else:
+            self._obs_buffers = np.ones((2, self.num_runs, self.num_features))
+        assert self.replay_buffer is None, 'replay is not supported for batched runs'
+
+    def _set_weights(self, given_weight_vector):
+        """
+        Sets the weights of all the runs. A single weight vector is copied
+        to every run; otherwise one row of weights per run is expected.
+        """
+        weights = np.asarray(given_weight_vector).reshape(-1, self.num_actions * self.num_features)
+        if weights.shape[0] != self.num_runs:
+            assert weights.shape[0] == 1
+            weights = np.repeat(weights, self.num_runs, axis=0)
+        self.weights = weights
+        # a view, so in-place updates of self.weights are reflected here
+        self.weights_matrix = self.weights.reshape(self.num_runs, self.num_actions, self.num_features)
+
+    def _process_raw_observation(self, obs):
+        """Processes a [num_runs, obs_dims] array of raw observations."""
+        self._obs_buffer_idx = 1 - self._obs_buffer_idx
+        observation = self._obs_buffers[self._obs_buffer_idx]
+        obs = np.asarray(obs).reshape(self.num_runs, -1)
+        if self.tilecoder:
+            observation[:, :-1] = self.tilecoder.getitems(obs)
+        elif self.bias:
+            observation[:, :-1] = obs
+        else:
+            observation[:] = obs
+
+        return observation
+
+    def _get_action_values(self, observation):
+        """Returns a [num_runs, num_actions] array of action values."""
+        if self.tilecoder:      # assumes 'indices' style for tilecoder
+            return np.take_along_axis(self.weights_matrix, observation[:, np.newaxis, :], axis=2).sum(axis=2)
+        return np.einsum('raf,rf->ra', self.weights_matrix, observation)
+
+    def _argmax(self, values):
+        """Returns the argmax of each row. Breaks ties uniformly randomly."""
+        self.max_value_per_step = values.max(axis=1)
+        ties = values == self.max_value_per_step[:, np.newaxis]
+        # the largest uniform random number among the tied entries wins
+        return np.argmax(self.rng.random(values.shape) * ties, axis=1)
+
+    def _choose_action_egreedy(self, state):
+        """Returns an array of epsilon-greedy action indices, one per run."""
+        self.exploratory_action = self.rng.random(self.num_runs) < self.epsilon
+        random_actions = self.rng.integers(self.num_actions, size=self.num_runs)
+        greedy_actions = self._argmax(self._get_action_values(state))
+        self.update_count += ~self.exploratory_action
+
+        return np.where(self.exploratory_action, random_actions, greedy_actions)
+
+    def _max_action_value(self, state):
+        """Returns the maximum action value of each run."""
+        return self._get_action_values(state).max(axis=1)
+
+    def _update_weights(self, reward, obs, term_flag):
+        reward = np.asarray(reward, dtype=float)
+        term_flag = np.asarray(term_flag, dtype=bool)
+
+        # only the weights of each run's past action are involved in the update
+        if self.tilecoder:
+            past_sa = (self.runs[:, np.newaxis], self.past_action[:, np.newaxis], self.past_obs)
+            prediction = self.weights_matrix[past_sa].sum(axis=1)
+        else:
+            past_sa = (self.runs, self.past_action)
+            prediction = np.einsum('rf,rf->r', self.weights_matrix[past_sa], self.past_obs)
+
+        # compute the target; terminal transitions do not bootstrap
+        q_next = np.where(term_flag, 0.0, self._max_action_value(obs))
+        target = reward - self.avg_reward + self.gamma * q_next
+        delta = target - prediction
+
+        # update the reward-rate estimate
+        avg_rew_delta = delta if not self.conv_error else (reward - self.avg_reward)
+        if self.robust_to_initialization:
+            old_avg_reward = self.avg_reward.copy()
+            self.avg_reward += self.beta * avg_rew_delta
+            updated_target = target + (old_avg_reward - self.avg_reward)
+            updated_delta = updated_target - prediction
+        else:
+            self.avg_reward += self.beta * avg_rew_delta
+            updated_delta = delta
+
+        # update the value estimates; repeated hashed indices are updated once per tile
+        if self.tilecoder and self.tilecoder.hashed:
+            np.add.at(self.weights_matrix, past_sa, (self.alpha * updated_delta)[:, np.newaxis])
+        elif self.tilecoder:
+            self.weights_matrix[past_sa] += (self.alpha * updated_delta)[:, np.newaxis]
+        else:
+            self.weights_matrix[past_sa] += (self.alpha * updated_delta)[:, np.newaxis] * self.past_obs
+
+    def _as_run_array(self, value):
+        """Broadcasts a per-step scalar to an array with one entry per run."""
+        return np.full(self.num_runs, value, dtype=float) if np.ndim(value) == 0 else value
+
+    def _initialize_step_size(self):
+        """Initializes both the step sizes, one per run."""
+        super()._initialize_step_size()
+        self.alpha = self._as_run_array(self.alpha)
+        self.beta = self._as_run_array(self.beta)
+
+    def _update_step_size(self):
+        """Updates both the step sizes of every run."""
+        super()._update_step_size()
+        self.alpha = self._as_run_array(self.alpha)
+        self.beta = self._as_run_array(self.beta)
+
+    def _update_epsilon(self):
+        """Decays the epsilon parameter of every run."""
+        super()._update_epsilon()
+        self.epsilon = self._as_run_array(self.epsilon)
+
+
+class CDiscQLambdaAgent(CDiscQAgent):
+    """
+    Implements CDiscQ(lambda): CDiscQ with Watkins-style eligibility traces.
+
+    The traces are sparse: only the (flat) indices of the weights with a
+    non-negligible trace are stored, along with their trace values. Every
+    step the traces decay by gamma * lambda, the ones that fall below
+    trace_threshold are pruned, and the past state-action pair's features
+    are added, so an update costs O(active indices) instead of O(weights).
+    The traces are cut after exploratory actions and terminations.
+    """
+    def __init__(self, **agent_args):
+        super().__init__(**agent_args)
+
+        self.lamda = agent_args.get('lambda', 0.9)
+        # replacing traces suit binary (tile-coded) features
+        self.trace_type = agent_args.get('trace_type',
+                                         'replacing' if self.tilecoder else 'accumulating')
+        assert self.trace_type in ['replacing', 'accumulating']
+        self.trace_threshold = agent_args.get('trace_threshold', 1e-3)
+        self.trace_decay = self.gamma * self.lamda
+
+        self._feature_indices = np.arange(self.num_features)
+        self._reset_traces()
+
+    def _reset_traces(self):
+        """Clears all the eligibility traces."""
+        self.trace_indices = np.empty(0, dtype=int)
+        self.trace_values = np.empty(0)
+
+    def _update_traces(self):
+        """Decays and prunes the traces and adds the past state-action pair."""
+        values = self.trace_values * self.trace_decay
+        keep = np.abs(values) >= self.trace_threshold
+        indices, values = self.trace_indices[keep], values[keep]
+
+        offset = self.num_features * self.past_action
+        if self.tilecoder:
+            # hashed tile indices may repeat within an observation; the feature
+            # of such an index is the number of tiles in it
+            new_indices, new_values = np.unique(self.past_obs, return_counts=True)
+            new_indices = new_indices + offset
+            new_values = new_values.astype(float)
+        else:
+            new_indices = self._feature_indices + offset
+            new_values = self.past_obs
+
+        if self.trace_type == 'replacing':
+            keep = ~np.isin(indices, new_indices)
+            self.trace_indices = np.concatenate((indices[keep], new_indices))
+            self.trace_values = np.concatenate((values[keep], new_values))
+        else:
+            indices, inverse = np.unique(np.concatenate((indices, new_indices)), return_inverse=True)
+            self.trace_values = np.bincount(inverse, weights=np.concatenate((values, new_values)),
+                                            minlength=indices.size)
+            self.trace_indices = indices
+
+    def _update_value_estimates(self, delta):
+        """Moves the values of all the traced state-action pairs along the TD error."""
+        self._update_traces()
+        self.weights[self.trace_indices] += self.alpha * delta * self.trace_values
+
+    def start(self, observation):
+        self._reset_traces()
+        return super().start(observation)
+
+    def resume(self, observation):
+        self._reset_traces()
+        return super().resume(observation)
+
+    def step(self, reward, observation, term_flag):
+        action = super().step(reward, observation, term_flag)
+        # cut the traces: the next transition does not follow the greedy policy
+        if term_flag or self.exploratory_action:
+            self._reset_traces()
+        return action
+
+
 class NaiveAgent():
     """Sets up the API for the naive controller."""
     def __init__(self, **agent_args):
@@ -93,6 +360,9 @@ class NaiveAgent():
     def start(self, obs):
         return self.agent.choose_action(obs[0])
 
+    def resume(self, obs):
+        return self.start(obs)
+
     def step(self, reward, obs, term_flag):
         return self.agent.choose_action(obs[0])
 
@@ -2,8 +2,10 @@
 
 import math
 import numpy as np
-from utils.helpers import get_weights_from_npy
+from utils.helpers import get_weights
 from utils.tilecoder import TileCoder
+from utils.weights_file import check_header, is_weights_file, read_header
+from utils.replay_buffer import ReplayBuffer
 
 
 class LFAControlAgent:
@@ -64,11 +66,15 @@ class LFAControlAgent:
             tiling_dims = agent_args["tiling_dims"]
             assert "limits_per_dim" in agent_args
             limits_per_dim = agent_args["limits_per_dim"]
+            # optional fixed budget of (hashed) tiles per action
+            memory_size = agent_args.get("memory_size", None)
 
             self.tilecoder = TileCoder(tiling_dims=tiling_dims,
                                        limits_per_dim=limits_per_dim,
                                        num_tilings=self.num_tilings,
-                                       style='indices')
+                                       style='indices',
+                                       memory_size=memory_size,
+                                       track_collisions=agent_args.get("track_collisions", False))
 
             self.num_features = self.tilecoder.n_tiles
             self.alpha_init /= self.num_tilings
@@ -79,16 +85,47 @@ class LFAControlAgent:
         else:
             self.bias = False
 
-        self.weights = np.zeros(self.num_features * self.num_actions)
+        self._set_weights(np.zeros(self.num_features * self.num_actions))
         self.avg_reward = None
 
-        # if the weights are supplied, they should be an ndarray in an npy file
-        # as a dictionary element with key 'weights'
+        # two preallocated observation buffers that are filled alternately,
+        # so that the current observation never overwrites self.past_obs
+        if self.tilecoder:
+            # tilecoder observations are indices; the last one is the bias
+            self._obs_buffers = np.empty((2, self.num_tilings + 1), dtype=int)
+            self._obs_buffers[:, -1] = self.num_features - 1
+        else:
+            # the bias feature, if any, is the last one and stays at 1
+            self._obs_buffers = np.ones((2, self.num_features))
+        self._obs_buffer_idx = 0
+
+        # optional replay buffer for Dyna-style planning updates, which
+        # replay stored transitions as samples from a model of the world
+        self.replay_capacity = agent_args.get('replay_capacity', 0)
+        self.num_planning_updates = agent_args.get('num_planning_updates', 1)
+        self.planning_batch_size = agent_args.get('planning_batch_size', 16)
+        if self.replay_capacity:
+            self.replay_buffer = ReplayBuffer(capacity=self.replay_capacity,
+                                              obs_size=self._obs_buffers.shape[1],
+                                              obs_dtype=self._obs_buffers.dtype)
+        else:
+            self.replay_buffer = None
+
+        # if the weights are supplied, they should be in a weights file or an
+        # ndarray in an npy file as a dictionary element with key 'weights_final'
         if 'weights_file' in agent_args:
-            weights = get_weights_from_npy(filename=agent_args['weights_file'],
-                                           seed_idx=agent_args['load_seed'])
+            if is_weights_file(agent_args['weights_file']):
+                # rejects the weights of a different tile-coder layout
+                header, _ = read_header(agent_args['weights_file'])
+                layout = {'num_actions': self.num_actions, 'tilecoder': bool(self.tilecoder)}
+                if self.tilecoder:
+                    layout.update(num_tilings=self.num_tilings, tiling_dims=tiling_dims,
+                                  limits_per_dim=limits_per_dim, memory_size=memory_size)
+                check_header(header, **layout)
+            weights = get_weights(filename=agent_args['weights_file'],
+                                  seed_idx=agent_args.get('load_seed', -1))
             assert weights.size == self.num_features * self.num_actions
-            self.weights = weights
+            self._set_weights(weights)
 
         # initialize the e-greedy exploration parameters
         self.epsilon_start = agent_args.get('epsilon_start', 0.9)
@@ -108,17 +145,36 @@ class LFAControlAgent:
         """
         Processes raw observation into a encoding, e.g., a tile-coded encoding.
         """
+        self._obs_buffer_idx = 1 - self._obs_buffer_idx
+        observation = self._obs_buffers[self._obs_buffer_idx]
         if self.tilecoder:
-            observation = self.tilecoder.getitem(obs)
-            # tilecoder observations are indices, so add the index of the bias
-            observation = np.concatenate((observation, [self.num_features - 1]))
+            observation[:-1] = self.tilecoder.getitem(obs)
+        elif self.bias:
+            observation[:-1] = obs
         else:
-            observation = obs
-            if self.bias:
-                observation = np.concatenate((observation, [1]))
+            observation[:] = obs
 
         return observation
 
+    def _process_raw_observations(self, obs):
+        """
+        Processes an [N, obs_dims] array of raw observations at once,
+        e.g., for offline training. Returns an array with one row per observation.
+        """
+        obs = np.asarray(obs).reshape(len(obs), -1)
+        if self.tilecoder:
+            observations = np.empty((len(obs), self.num_tilings + 1), dtype=int)
+            observations[:, :-1] = self.tilecoder.getitems(obs)
+            observations[:, -1] = self.num_features - 1
+        else:
+            observations = np.ones((len(obs), self.num_features))
+            if self.bias:
+                observations[:, :-1] = obs
+            else:
+                observations[:] = obs
+
+        return observations
+
     def _get_representation(self, observation, action):
         """Returns the agent state.
 
@@ -169,14 +225,37 @@ class LFAControlAgent:
         rep = self._get_representation(observation, action)
         return self._get_linear_value_approximation(rep)
 
+    def _get_action_values(self, observation):
+        """Returns the values of all the actions for a given observation.
+
+        The flat weight vector is viewed as a [num_actions, num_features]
+        matrix, so all the action values come from a single gather (with
+        tile coding) or a single matrix-vector product (dense features).
+
+        Args:
+            observation: the processed observation
+        Returns:
+            values: an array of size self.num_actions
+        """
+        if self.tilecoder:      # assumes 'indices' style for tilecoder
+            return self.weights_matrix[:, observation].sum(axis=1)
+        return self.weights_matrix @ observation
+
     def _set_weights(self, given_weight_vector):
         """Sets the agent's weights to the given weight vector."""
         self.weights = given_weight_vector
+        # a view, so in-place updates of self.weights are reflected here
+        self.weights_matrix = self.weights.reshape(self.num_actions, self.num_features)
+        # scratch space for in-place updates of one action's weights
+        self._update_buffer = np.empty(self.num_features, dtype=self.weights.dtype)
 
     def _argmax(self, values):
         """Returns the argmax of a list. Breaks ties uniformly randomly."""
-        self.max_value_per_step = np.max(values)
-        return self.rng.choice(np.argwhere(values == self.max_value_per_step).flatten())
+        self.max_value_per_step = values.max()
+        ties = np.flatnonzero(values == self.max_value_per_step)
+        if ties.size == 1:      # choosing from one element draws no random number
+            return ties[0]
+        return self.rng.choice(ties)
 
     def _choose_action_egreedy(self, state):
         """
@@ -193,7 +272,7 @@ class LFAControlAgent:
             self.max_value_per_step = None
             self.exploratory_action = True
         else:
-            q_s = np.array([self._get_value(state, a) for a in self.actions])
+            q_s = self._get_action_values(state)
             action = self._argmax(q_s)
             self.exploratory_action = False
             self.update_count += 1
@@ -206,7 +285,7 @@ class LFAControlAgent:
         for a given agent-state vector. If the maximum action value is
         shared by more than one action, one of them is randomly chosen.
         """
-        q_s = np.array([self._get_value(state, a) for a in self.actions])
+        q_s = self._get_action_values(state)
         argmax_action = self._argmax(q_s)
 
         return q_s[argmax_action]
@@ -231,6 +310,25 @@ class LFAControlAgent:
 
         return action
 
+    def resume(self, observation):
+        """
+        Continues the experiment from the first observation of a new
+        episode, e.g., after resuming from a checkpoint. Unlike start,
+        the step sizes and the timestep are left as they were.
+
+        Args:
+            observation: the first observation returned by the environment
+        Returns:
+            action: an action-index integer
+        """
+        obs = self._process_raw_observation(observation)
+        action = self._choose_action_egreedy(obs)
+
+        self.past_obs = obs
+        self.past_action = action
+
+        return action
+
     def step(self, reward, observation, term_flag):
         """
         Returns a new action corresponding to the new observation
@@ -244,6 +342,9 @@ class LFAControlAgent:
         """
         obs = self._process_raw_observation(observation)
         self._update_weights(reward, obs, term_flag)
+        if self.replay_buffer is not None:
+            self.replay_buffer.add(self.past_obs, self.past_action, reward, obs, term_flag)
+            self._planning_update()
         action = self._choose_action_egreedy(obs)
 
         self.timestep += 1
@@ -281,5 +382,14 @@ class LFAControlAgent:
                         (self.epsilon_start - self.epsilon_end) * math.e **
                         (-self.timestep / self.epsilon_decay_param))
 
+    def _planning_update(self):
+        """Performs the planning updates, each on a batch of stored transitions."""
+        for _ in range(self.num_planning_updates):
+            batch = self.replay_buffer.sample(self.planning_batch_size, self.rng)
+            self._replay_update(*batch)
+
     def _update_weights(self, reward, obs):
         raise NotImplementedError
+
+    def _replay_update(self, obs, actions, rewards, next_obs, terms):
+        raise NotImplementedError
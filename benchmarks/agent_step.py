@@ -0,0 +1,75 @@
+"""
+Microbenchmark for the per-step cost of the CDiscQ agent.
+
+Compares the batched all-action evaluation against the old per-action loop,
+for both the tile-coded and the dense linear paths, and reports the number
+of agent steps per second. Run it from the root of the repository:
+
+    python -m benchmarks.agent_step
+"""
+
+import argparse
+import time
+import numpy as np
+from agent.algorithms import CDiscQAgent
+
+
+tilecoded_args = {
+    'num_actions': 3,
+    'num_features': 1,
+    'alpha': 0.25,
+    'eta': 0.0,
+    'gamma': 0.99,
+    'epsilon_start': 0.1,
+    'epsilon_end': 0.1,
+    'tilecoder': True,
+    'num_tilings': 8,
+    'tiling_dims': [7],
+    'limits_per_dim': [[-15, 15]],
+    }
+dense_args = {
+    'num_actions': 3,
+    'num_features': 1,
+    'alpha': 0.01,
+    'eta': 0.0,
+    'gamma': 0.99,
+    'epsilon_start': 0.1,
+    'epsilon_end': 0.1,
+    }
+
+
+def per_action_values(agent, observation):
+    """The per-action loop the agent used before the batched evaluation."""
+    return np.array([agent._get_value(observation, a) for a in agent.actions])
+
+
+def run_agent(agent_args, num_steps, per_action=False, seed=0):
+    """Steps an agent on random roll rates and returns the steps per second."""
+    agent = CDiscQAgent(rng_seed=seed, **agent_args)
+    if per_action:
+        agent._get_action_values = lambda obs: per_action_values(agent, obs)
+    rng = np.random.default_rng(seed)
+    observations = rng.uniform(-15, 15, size=(num_steps + 1, 1))
+    rewards = -np.abs(observations[:, 0])
+
+    agent.start(observations[0])
+    start_time = time.perf_counter()
+    for t in range(1, num_steps + 1):
+        agent.step(rewards[t], observations[t], False)
+    return num_steps / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent's steps per second")
+    parser.add_argument('--num-steps', type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, agent_args in [('tile-coded', tilecoded_args), ('dense', dense_args)]:
+        before = run_agent(agent_args, args.num_steps, per_action=True)
+        after = run_agent(agent_args, args.num_steps, per_action=False)
+        print(f'{name:>10}: per-action loop {before:10.0f} steps/s | '
+              f'batched {after:10.0f} steps/s | speedup {after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
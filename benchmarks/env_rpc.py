@@ -0,0 +1,92 @@
+"""
+Round-trip benchmark for the kRPC environments, run against the local
+stand-in for KSP (env/krpc_stand_in.py).
+
+Reports the number of remote calls made by reset and by each step, broken
+down by call, the number of streams left open, and the wall-clock time of
+reset (per phase) and step with the given per-call latency. Run it from the
+root of the repository:
+
+    python -m benchmarks.env_rpc [--latency 0.001] [--output rpc.json]
+"""
+
+import argparse
+import json
+import random
+import time
+from env.krpc_stand_in import StandInConnection
+from env.rolling_payload import RollingPayloadEnv, RollingPayloadEnvContinuous
+
+
+environments = {
+    'RollingPayload': (RollingPayloadEnv, lambda: random.randint(0, 2)),
+    'RollingPayloadContinuous': (RollingPayloadEnvContinuous, lambda: random.uniform(-45, 45)),
+    }
+
+
+def measure(env_name, num_steps, num_resets, latency):
+    """Runs an environment against the stand-in and returns its call profile."""
+    env_class, sample_action = environments[env_name]
+    conn = StandInConnection(latency=latency)
+    env = env_class(conn)
+    random.seed(0)
+    # the first reset also sets up what persists across resets
+    env.reset(seed=0)
+    phase_time = dict(env.reset_time)
+
+    conn.reset_call_counts()
+    start_time = time.perf_counter()
+    for i in range(num_resets):
+        env.reset(seed=i)
+    reset_time = (time.perf_counter() - start_time) / num_resets
+    reset_calls = dict(conn.call_counts)
+    phase_time = {phase: (env.reset_time[phase] - phase_time[phase]) / num_resets
+                  for phase in phase_time}
+
+    conn.reset_call_counts()
+    start_time = time.perf_counter()
+    for _ in range(num_steps):
+        env.step(sample_action())
+    step_time = (time.perf_counter() - start_time) / num_steps
+    step_calls = dict(conn.call_counts)
+
+    return {'env': env_name,
+            'latency_ms': latency * 1000,
+            'calls_per_reset': sum(reset_calls.values()) / num_resets,
+            'calls_per_step': sum(step_calls.values()) / num_steps,
+            'reset_ms': reset_time * 1000,
+            'step_ms': step_time * 1000,
+            'open_streams': len(conn.streams),
+            'reset_phase_ms': {phase: t * 1000 for phase, t in phase_time.items()},
+            'reset_calls': {name: count / num_resets for name, count in sorted(reset_calls.items())},
+            'step_calls': {name: count / num_steps for name, count in sorted(step_calls.items())},
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the kRPC round-trips of the environments")
+    parser.add_argument('--envs', nargs='+', default=list(environments))
+    parser.add_argument('--num-steps', type=int, default=200)
+    parser.add_argument('--num-resets', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.001, help='seconds per remote call')
+    parser.add_argument('--output', default=None, help='optional JSON file for the results')
+    args = parser.parse_args()
+
+    profiles = [measure(env_name, args.num_steps, args.num_resets, args.latency)
+                for env_name in args.envs]
+    for profile in profiles:
+        print(f"{profile['env']:<26} reset {profile['calls_per_reset']:5.1f} calls {profile['reset_ms']:8.2f} ms | "
+              f"step {profile['calls_per_step']:5.1f} calls {profile['step_ms']:8.2f} ms | "
+              f"{profile['open_streams']} open streams")
+        print('    reset phases: ' + ', '.join(f'{phase} {t:.2f} ms'
+                                             for phase, t in profile['reset_phase_ms'].items()))
+        for name, count in profile['step_calls'].items():
+            print(f"    {name:<40} {count:5.1f} per step")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(profiles, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start report for the experiment, inference and hardware entry points.
+
+Each module is imported in a fresh interpreter with `-X importtime`; the
+report lists the total import time, the wall-clock time of the interpreter,
+and the slowest imports. Modules whose dependencies are missing on this
+machine (e.g., krpc or the Raspberry Pi libraries) are reported as failed.
+Run it from the root of the repository:
+
+    python -m benchmarks.startup_time [--output startup.json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+entry_points = [
+    'experiment',
+    'inference',
+    'utils.policy_table',
+    'agent.algorithms',
+    'env.rolling_payload',
+    'hardware_api.orientation',
+    ]
+
+
+def parse_importtime(stderr):
+    """Returns (module, self_us, cumulative_us) for each line of -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure(module, num_slowest=5):
+    """Imports a module in a fresh interpreter and returns its startup profile."""
+    start_time = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    wall_time = time.perf_counter() - start_time
+
+    imports = parse_importtime(result.stderr)
+    profile = {'module': module,
+               'ok': result.returncode == 0,
+               'wall_ms': wall_time * 1000,
+               'import_ms': sum(self_us for _, self_us, _ in imports) / 1000,
+               'slowest': [{'module': name, 'cumulative_ms': cumulative_us / 1000}
+                           for name, _, cumulative_us in
+                           sorted(imports, key=lambda x: x[2], reverse=True)[:num_slowest]],
+               }
+    if not profile['ok']:
+        profile['error'] = result.stderr.strip().splitlines()[-1]
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cold-start time of the entry points")
+    parser.add_argument('--modules', nargs='+', default=entry_points)
+    parser.add_argument('--output', default=None, help='optional JSON file for the results')
+    args = parser.parse_args()
+
+    profiles = [measure(module) for module in args.modules]
+    for profile in profiles:
+        status = 'ok' if profile['ok'] else f"failed ({profile['error']})"
+        print(f"{profile['module']:<26} import {profile['import_ms']:8.1f} ms | "
+              f"wall {profile['wall_ms']:8.1f} ms | {status}")
+        for slow in profile['slowest']:
+            print(f"    {slow['module']:<40} {slow['cumulative_ms']:8.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(profiles, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
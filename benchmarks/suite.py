@@ -0,0 +1,324 @@
+"""
+Microbenchmark suite for the code that runs in the control loop.
+
+Each case times individual calls of one operation (e.g., a tile-coder
+lookup or an agent step) and reports the percentiles of the per-call
+latency, less the overhead of the timer, and the throughput of an untimed
+loop of the same calls. The results can be saved as JSON and compared
+against a baseline. Each case is measured --repeat times; the fastest
+measurement is kept, and the spread of the medians across the repeats is
+recorded as a measure of the noise. A case is reported as a regression,
+and the exit status is 1, if its median latency grew by more than
+--threshold and by more than the noise: the spreads of the run and of
+the baseline, and at least --min-delta-us.
+
+benchmarks/baseline.json was recorded on one machine, so it is only a
+reference for others; record a baseline on yours before comparing. Run
+it from the root of the repository:
+
+    python -m benchmarks.suite [--filter agent] [--output results.json]
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+
+tilecoder_args = {'num_tilings': 8, 'tiling_dims': [7], 'limits_per_dim': [[-15, 15]]}
+agent_args = dict(tilecoder_args, num_actions=3, num_features=1, alpha=0.25, eta=0.0, gamma=0.99,
+                  epsilon_start=0.1, epsilon_end=0.1, tilecoder=True, rng_seed=0)
+dense_agent_args = dict(num_actions=3, num_features=1, alpha=0.01, eta=0.0, gamma=0.99,
+                        epsilon_start=0.1, epsilon_end=0.1, rng_seed=0)
+
+
+def _cycle(values):
+    """Returns a function that returns the next of the values (cyclically) at each call."""
+    position = [0]
+
+    def next_value():
+        position[0] = (position[0] + 1) % len(values)
+        return values[position[0]]
+    return next_value
+
+
+def _roll_rates(shape=(1024, 1)):
+    return np.random.default_rng(0).uniform(-15, 15, size=shape)
+
+
+# each setup function returns the operation to time, which takes no arguments
+
+def setup_tilecoder_getitem():
+    from utils.tilecoder import TileCoder
+    tilecoder = TileCoder(style='indices', **tilecoder_args)
+    next_obs = _cycle(_roll_rates())
+    return lambda: tilecoder.getitem(next_obs())
+
+
+def setup_tilecoder_getitems_1024():
+    from utils.tilecoder import TileCoder
+    tilecoder = TileCoder(style='indices', **tilecoder_args)
+    observations = _roll_rates()
+    return lambda: tilecoder.getitems(observations)
+
+
+def _setup_agent_step(args):
+    from agent.algorithms import CDiscQAgent
+    agent = CDiscQAgent(**args)
+    next_obs = _cycle(_roll_rates())
+    agent.start(next_obs())
+
+    def step():
+        obs = next_obs()
+        agent.step(-abs(obs[0]), obs, False)
+    return step
+
+
+def setup_agent_step():
+    return _setup_agent_step(agent_args)
+
+
+def setup_agent_step_dense():
+    return _setup_agent_step(dense_agent_args)
+
+
+def setup_agent_start():
+    from agent.algorithms import CDiscQAgent
+    agent = CDiscQAgent(**agent_args)
+    next_obs = _cycle(_roll_rates())
+    return lambda: agent.start(next_obs())
+
+
+def setup_agent_update_weights():
+    from agent.algorithms import CDiscQAgent
+    agent = CDiscQAgent(**agent_args)
+    observations = [agent._process_raw_observation(obs).copy() for obs in _roll_rates((64, 1))]
+    next_obs = _cycle(observations)
+    agent.start(_roll_rates((1, 1))[0])
+    return lambda: agent._update_weights(-1.0, next_obs(), False)
+
+
+# removed when the suite exits
+_temp_folder = None
+
+
+def _weights_file():
+    from utils.weights_file import save_weights_file
+    global _temp_folder
+    if _temp_folder is None:
+        _temp_folder = tempfile.TemporaryDirectory()
+    filename = os.path.join(_temp_folder.name, 'benchmark_weights.plwt')
+    num_weights = 3 * (8 * 8 + 1)
+    save_weights_file(filename, np.random.default_rng(0).normal(size=num_weights),
+                      num_actions=3, num_tilings=8, tiling_dims=[7], limits_per_dim=[[-15, 15]])
+    return filename
+
+
+def setup_inference_choose_action():
+    from inference import InferenceAgent
+    agent = InferenceAgent(_weights_file())
+    next_obs = _cycle(_roll_rates())
+    return lambda: agent.choose_action(next_obs())
+
+
+def setup_compiled_policy_choose_action():
+    from inference import InferenceAgent
+    policy = InferenceAgent(_weights_file()).compile_policy()
+    next_obs = _cycle(_roll_rates())
+    return lambda: policy.choose_action(next_obs())
+
+
+def setup_naive_controller():
+    from models.Naive.controller import NaiveController
+    controller = NaiveController()
+    next_rate = _cycle(_roll_rates()[:, 0].tolist())
+    return lambda: controller.choose_action(next_rate())
+
+
+def setup_naive_smooth_controller():
+    from models.Naive.controller import NaiveSmoothController
+    controller = NaiveSmoothController()
+    next_rate = _cycle(_roll_rates()[:, 0].tolist())
+    return lambda: controller.choose_action(next_rate())
+
+
+def setup_pid_controller_transfer():
+    from models.PID.controller import Controller
+    from models.PID.drag import Drag
+    controller = Controller(Drag())
+    next_rate = _cycle(_roll_rates()[:, 0].tolist())
+    return lambda: controller.transfer(next_rate())
+
+
+def setup_pid_process_step():
+    from models.PID.drag import Drag
+    from models.PID.process import Process
+    process = Process(Drag())
+    next_u = _cycle((_roll_rates()[:, 0] * 1e-3).tolist())
+    return lambda: process.step(next_u())
+
+
+def setup_simulator_step():
+    from env.simulated_payload import SimulatedPayloadEnv
+    env = SimulatedPayloadEnv()
+    env.reset(seed=0)
+    next_action = _cycle([0, 1, 2])
+    return lambda: env.step(next_action())
+
+
+cases = {
+    'tilecoder.getitem': setup_tilecoder_getitem,
+    'tilecoder.getitems[1024]': setup_tilecoder_getitems_1024,
+    'agent.start': setup_agent_start,
+    'agent.step': setup_agent_step,
+    'agent.step[dense]': setup_agent_step_dense,
+    'agent._update_weights': setup_agent_update_weights,
+    'inference.choose_action': setup_inference_choose_action,
+    'compiled_policy.choose_action': setup_compiled_policy_choose_action,
+    'naive.choose_action': setup_naive_controller,
+    'naive_smooth.choose_action': setup_naive_smooth_controller,
+    'pid.controller.transfer': setup_pid_controller_transfer,
+    'pid.process.step': setup_pid_process_step,
+    'simulator.step': setup_simulator_step,
+    }
+
+
+def _time_calls(operation, num_calls):
+    """Returns the time of each of num_calls calls of the operation, in nanoseconds."""
+    latencies = np.empty(num_calls)
+    timer = time.perf_counter_ns
+    for i in range(num_calls):
+        start_time = timer()
+        operation()
+        latencies[i] = timer() - start_time
+    return latencies
+
+
+def measure(operation, duration=0.2, warmup_time=0.05, max_calls=200000):
+    """
+    Times individual calls of an operation, for about duration seconds.
+
+    Returns:
+        a dictionary of per-call latency percentiles (in microseconds) and the throughput
+    """
+    # warms up the operation and estimates its cost
+    num_calls = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < warmup_time:
+        operation()
+        num_calls += 1
+    num_calls = min(max_calls, max(100, int(duration * num_calls / warmup_time)))
+
+    # the overhead of timing a call to a function that does nothing
+    overhead = np.median(_time_calls(lambda: None, 1000))
+    latencies = np.maximum(_time_calls(operation, num_calls) - overhead, 0) / 1e3
+
+    start_time = time.perf_counter()
+    for _ in range(num_calls):
+        operation()
+    calls_per_s = num_calls / (time.perf_counter() - start_time)
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {'num_calls': num_calls, 'min_us': latencies.min(),
+            'p50_us': p50, 'p90_us': p90, 'p99_us': p99, 'max_us': latencies.max(),
+            'mean_us': latencies.mean(), 'calls_per_s': calls_per_s}
+
+
+def compare(results, baseline, threshold, min_delta_us):
+    """
+    Returns the ratio of the median latency to the baseline's for the cases
+    in both, and the cases whose median grew by more than 1 + threshold
+    times the baseline's and by more than the noise of both measurements
+    (at least min_delta_us).
+    """
+    ratios, regressions = {}, []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        ratios[name] = result['p50_us'] / base['p50_us']
+        noise = max(min_delta_us, result.get('p50_spread_us', 0.0) + base.get('p50_spread_us', 0.0))
+        if ratios[name] > 1 + threshold and result['p50_us'] - base['p50_us'] > noise:
+            regressions.append(name)
+    return ratios, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the microbenchmark suite")
+    parser.add_argument('--filter', default='', help='only run the cases whose name contains this')
+    parser.add_argument('--duration', type=float, default=0.2,
+                        help='seconds of timed calls per measurement')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='measure each case this many times and keep the fastest (by median)')
+    parser.add_argument('--output', default=None, help='optional JSON file for the results')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--save-baseline', default=None,
+                        help='save the results as a baseline in this file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative growth of the median latency reported as a regression')
+    parser.add_argument('--min-delta-us', type=float, default=0.5,
+                        help='smallest growth of the median latency (in us) reported as a '
+                             'regression')
+    args = parser.parse_args()
+
+    operations = {}
+    for name, setup in cases.items():
+        if args.filter not in name:
+            continue
+        try:
+            operations[name] = setup()
+        except Exception as ex:       # e.g., a missing optional dependency
+            print(f'{name:<30} skipped ({type(ex).__name__}: {ex})')
+
+    # the repeats are interleaved so that a busy period of the machine disturbs one measurement
+    # of each case rather than all of one, and the fastest measurement of each case is kept
+    measurements = {name: [] for name in operations}
+    for _ in range(args.repeat):
+        for name, operation in operations.items():
+            measurements[name].append(measure(operation, duration=args.duration))
+    results = {}
+    for name, case_measurements in measurements.items():
+        medians = [measurement['p50_us'] for measurement in case_measurements]
+        results[name] = dict(min(case_measurements, key=lambda measurement: measurement['p50_us']),
+                             p50_spread_us=max(medians) - min(medians))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    ratios, regressions = compare(results, baseline, args.threshold, args.min_delta_us)
+
+    for name, result in results.items():
+        line = (f"{name:<30} p50 {result['p50_us']:8.2f} us | p90 {result['p90_us']:8.2f} us | "
+                f"p99 {result['p99_us']:8.2f} us | {result['calls_per_s']:10.0f} calls/s")
+        if name in ratios:
+            line += f" | {ratios[name]:5.2f}x baseline"
+            if name in regressions:
+                line += ' REGRESSION'
+        print(line)
+
+    report = {'machine': {'python': sys.version.split()[0], 'numpy': np.__version__,
+                          'platform': platform.platform(), 'processor': platform.processor()},
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': results}
+    if baseline:
+        report['baseline'] = {'file': args.baseline, 'ratios': ratios, 'regressions': regressions}
+    for filename in [args.output, args.save_baseline]:
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}: '
+              + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+"""
+This file implements a local stand-in for a kRPC connection to KSP, so that
+RollingPayloadEnv can be run, benchmarked, and regression-tested without
+the game.
+
+Only the subset of the kRPC API used by the environments is implemented.
+The payload is simulated by SimulatedPayloadEnvContinuous, stepped at the
+game's physics tick while the game clock follows the wall clock (faster
+under physics warp). Every remote procedure call can be delayed by a fixed
+latency, and all the calls are counted by name, so the round-trips of
+step and reset can be measured:
+
+    conn = StandInConnection(latency=0.001)
+    env = RollingPayloadEnv(conn)
+    env.reset(seed=0)
+    conn.reset_call_counts()
+    env.step(1)
+    print(conn.num_calls, conn.call_counts)
+
+Reading a stream is not a remote call, but adding one is. The vessel is
+modelled as spinning about the y axis, in every reference frame.
+"""
+
+import math
+import time
+from collections import Counter
+from env.simulated_payload import SimulatedPayloadEnvContinuous
+
+
+class StandInConnection():
+    """Stands in for the connection returned by krpc.connect."""
+
+    def __init__(self, latency=0.0, physics_tick=0.02, quicksaves=("1U_2k",), **env_args):
+        """
+        Args:
+            latency: seconds added to every remote call
+            physics_tick: game seconds per step of the simulated physics
+            quicksaves: the names of the quicksaves that can be loaded
+            **env_args: parameters of the simulated payload (see SimulatedPayloadEnv)
+        """
+        self.latency = latency
+        self.quicksaves = set(quicksaves)
+        self.call_counts = Counter()
+        self.streams = []
+        self._streaming = False
+        self.closed = False
+        self.krpc = _KRPC(self)
+        self.space_center = _SpaceCenter(self, physics_tick, env_args)
+
+    @property
+    def num_calls(self):
+        return sum(self.call_counts.values())
+
+    def reset_call_counts(self):
+        self.call_counts.clear()
+
+    def _call(self, name):
+        """Counts (and delays) one remote call, then brings the game up to date."""
+        if self.closed:
+            raise ConnectionError('the connection is closed')
+        if not self._streaming:
+            self.call_counts[name] += 1
+            if self.latency:
+                time.sleep(self.latency)
+        self.space_center._advance()
+
+    def add_stream(self, func, *args, **kwargs):
+        self._call('add_stream')
+        stream = _Stream(self, func, args, kwargs)
+        self.streams.append(stream)
+        return stream
+
+    def close(self):
+        for stream in list(self.streams):
+            stream.remove()
+        self.closed = True
+
+
+class _KRPC():
+    def __init__(self, conn):
+        self._conn = conn
+
+    def get_status(self):
+        self._conn._call('KRPC.get_status')
+        return {'version': 'stand-in'}
+
+
+class _Stream():
+    def __init__(self, conn, func, args, kwargs):
+        self._conn = conn
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def __call__(self):
+        self._conn._streaming = True
+        try:
+            return self._func(*self._args, **self._kwargs)
+        finally:
+            self._conn._streaming = False
+
+    def remove(self):
+        self._conn._call('remove_stream')
+        if self in self._conn.streams:
+            self._conn.streams.remove(self)
+
+
+class _ReferenceFrame():
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'ReferenceFrame({self.name})'
+
+
+class _SpaceCenter():
+    def __init__(self, conn, physics_tick, env_args):
+        self._conn = conn
+        self._physics_tick = physics_tick
+        self._env_args = dict(env_args, sim_dt=physics_tick)
+        # KSP keeps falling below the environment's termination altitude
+        self._env_args.setdefault('termination_altitude', float('-inf'))
+        # the same noise per 0.5 s as the simulated environment's default step
+        self._env_args.setdefault('roll_noise', 0.05 * math.sqrt(physics_tick / 0.5))
+        self._ut = 0.0
+        self._physics_warp_factor = 0
+        self._wall_time = time.perf_counter()
+        self._vessel = None
+        self._body = _Body(conn)
+        self._sim = None
+        self._num_loads = 0
+
+    def _advance(self):
+        """Steps the physics for the game time elapsed since the last call."""
+        now = time.perf_counter()
+        game_time = (now - self._wall_time) * (self._physics_warp_factor + 1)
+        num_ticks = int(game_time / self._physics_tick)
+        self._wall_time += num_ticks * self._physics_tick / (self._physics_warp_factor + 1)
+        if self._sim is None:
+            self._ut += num_ticks * self._physics_tick
+            return
+        angle = self._vessel._fin_angle()
+        for _ in range(num_ticks):
+            self._sim.step(angle)
+            self._ut += self._physics_tick
+        self._vessel._roll_angle += num_ticks * self._physics_tick * self._sim.rate_of_roll
+
+    @property
+    def ut(self):
+        self._conn._call('SpaceCenter.ut')
+        return self._ut
+
+    @property
+    def physics_warp_factor(self):
+        self._conn._call('SpaceCenter.physics_warp_factor')
+        return self._physics_warp_factor
+
+    @physics_warp_factor.setter
+    def physics_warp_factor(self, value):
+        self._conn._call('SpaceCenter.set_physics_warp_factor')
+        assert value in range(4), 'the physics warp factor should be between 0 and 3'
+        self._physics_warp_factor = value
+
+    @property
+    def active_vessel(self):
+        self._conn._call('SpaceCenter.active_vessel')
+        assert self._vessel is not None, 'no active vessel; load a quicksave first'
+        return self._vessel
+
+    def load(self, name):
+        """Loads a quicksave: the old vessel (and its parts) become invalid."""
+        self._conn._call('SpaceCenter.load')
+        if name not in self._conn.quicksaves:
+            raise ValueError(f"No save named '{name}'")
+        if self._vessel is not None:
+            self._vessel._valid = False
+        self._sim = SimulatedPayloadEnvContinuous(**self._env_args)
+        self._sim.reset(seed=self._num_loads)
+        self._num_loads += 1
+        self._vessel = _Vessel(self._conn, self._sim)
+
+    def transform_direction(self, direction, from_frame, to_frame):
+        self._conn._call('SpaceCenter.transform_direction')
+        return tuple(direction)
+
+
+class _RemoteObject():
+    """Base class for the objects that belong to a vessel and expire when a quicksave is loaded."""
+    def __init__(self, conn, vessel):
+        self._conn = conn
+        self._owner = vessel
+
+    def _call(self, name):
+        self._conn._call(name)
+        if not self._owner._valid:
+            raise RuntimeError('No such vessel; it was removed when a quicksave was loaded')
+
+
+class _Vessel(_RemoteObject):
+    def __init__(self, conn, sim):
+        super().__init__(conn, self)
+        self._valid = True
+        self._sim = sim
+        self._roll_angle = 0.0
+        self._reference_frame = _ReferenceFrame('vessel')
+        self._orbit = _Orbit(conn, self)
+        self._control = _Control(conn, self)
+        self._fins = [_Part(conn, self, 'Grid Fin S') for _ in range(sim.num_fins)]
+
+    def _fin_angle(self):
+        """The mean deploy angle of the deployed fins, which drives the simulation."""
+        angles = [fin.modules_[1].deploy_angle for fin in self._fins if fin.modules_[1].deployed]
+        return sum(angles) / len(angles) if angles else 0.0
+
+    @property
+    def orbit(self):
+        self._call('Vessel.orbit')
+        return self._orbit
+
+    @property
+    def control(self):
+        self._call('Vessel.control')
+        return self._control
+
+    @property
+    def parts(self):
+        self._call('Vessel.parts')
+        return _Parts(self._conn, self)
+
+    @property
+    def reference_frame(self):
+        self._call('Vessel.reference_frame')
+        return self._reference_frame
+
+    def flight(self, reference_frame=None):
+        self._call('Vessel.flight')
+        return _Flight(self._conn, self)
+
+    def rotation(self, reference_frame):
+        self._call('Vessel.rotation')
+        return (0.0, 0.0, 0.0, 1.0)
+
+    def angular_velocity(self, reference_frame):
+        self._call('Vessel.angular_velocity')
+        return (0.0, self._sim.rate_of_roll, 0.0)
+
+
+class _Orbit(_RemoteObject):
+    def __init__(self, conn, vessel):
+        super().__init__(conn, vessel)
+        self._body = conn.space_center._body
+
+    @property
+    def body(self):
+        self._call('Orbit.body')
+        return self._body
+
+
+class _Body(_RemoteObject):
+    """A celestial body; unlike the vessel, it remains valid when a quicksave is loaded."""
+    def __init__(self, conn):
+        super().__init__(conn, self)
+        self._valid = True
+        self._frame = _ReferenceFrame('non_rotating')
+
+    @property
+    def non_rotating_reference_frame(self):
+        self._call('CelestialBody.non_rotating_reference_frame')
+        return self._frame
+
+
+class _Control(_RemoteObject):
+    def __init__(self, conn, vessel):
+        super().__init__(conn, vessel)
+        self._sas = True
+        self._rcs = True
+
+    @property
+    def sas(self):
+        self._call('Control.sas')
+        return self._sas
+
+    @sas.setter
+    def sas(self, value):
+        self._call('Control.set_sas')
+        self._sas = value
+
+    @property
+    def rcs(self):
+        self._call('Control.rcs')
+        return self._rcs
+
+    @rcs.setter
+    def rcs(self, value):
+        self._call('Control.set_rcs')
+        self._rcs = value
+
+
+class _Flight(_RemoteObject):
+    @property
+    def pitch(self):
+        self._call('Flight.pitch')
+        return 90.0
+
+    @property
+    def heading(self):
+        self._call('Flight.heading')
+        return 0.0
+
+    @property
+    def roll(self):
+        self._call('Flight.roll')
+        return self._owner._roll_angle
+
+    @property
+    def surface_altitude(self):
+        self._call('Flight.surface_altitude')
+        return self._owner._sim.altitude
+
+
+class _Parts(_RemoteObject):
+    def with_name(self, name):
+        self._call('Parts.with_name')
+        return [part for part in self._owner._fins if part.name_ == name]
+
+
+class _Part(_RemoteObject):
+    def __init__(self, conn, vessel, name):
+        super().__init__(conn, vessel)
+        self.name_ = name
+        # the grid-fin module is the second module of the part, as in KSP
+        self.modules_ = [_Module(conn, vessel, 'ModuleDragModifier'),
+                         _Module(conn, vessel, 'ModuleControlSurface')]
+
+    @property
+    def name(self):
+        self._call('Part.name')
+        return self.name_
+
+    @property
+    def modules(self):
+        self._call('Part.modules')
+        return list(self.modules_)
+
+
+class _Module(_RemoteObject):
+    def __init__(self, conn, vessel, name):
+        super().__init__(conn, vessel)
+        self.name_ = name
+        self.deployed = False
+        self.deploy_angle = 0.0
+
+    def set_field_bool(self, field, value):
+        self._call('Module.set_field_bool')
+        if field == 'Deploy':
+            self.deployed = value
+
+    def set_field_float(self, field, value):
+        self._call('Module.set_field_float')
+        if field == 'Deploy Angle':
+            self.deploy_angle = value
+
+
+if __name__ == "__main__":
+    from env.rolling_payload import RollingPayloadEnv
+
+    conn = StandInConnection(latency=0.0)
+    env = RollingPayloadEnv(conn)
+    conn.reset_call_counts()
+    state = env.reset(seed=0)
+    print(f"reset: {conn.num_calls} calls {dict(conn.call_counts)}")
+    for i in range(3):
+        conn.reset_call_counts()
+        state, reward, termination = env.step(1)
+        print(f"step: {conn.num_calls} calls, state {state}")
+    print(f"{len(conn.streams)} open streams")
+    print(dict(conn.call_counts))
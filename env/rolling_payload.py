@@ -6,33 +6,108 @@ building on Piotr Kubica's work on using kRPC to control KSP using Python.
 import math
 import time
 import random
-import krpc
+
+
+def rotate_to_local_frame(rotation, vector):
+    """
+    Expresses a vector given in a reference frame in the frame of an object
+    with the given rotation (an (x, y, z, w) quaternion, as returned by kRPC)
+    relative to that reference frame, i.e., rotates it by the inverse rotation.
+    """
+    x, y, z, w = rotation
+    vx, vy, vz = vector
+    # v' = v + 2 q_v x (q_v x v + w v), with q_v = -(x, y, z) for the inverse rotation
+    tx = -y * vz + z * vy + w * vx
+    ty = -z * vx + x * vz + w * vy
+    tz = -x * vy + y * vx + w * vz
+    return (vx + 2 * (-y * tz + z * ty),
+            vy + 2 * (-z * tx + x * tz),
+            vz + 2 * (-x * ty + y * tx))
 
 
 class RollingPayloadEnv():
     """A simple version of the task with only one action to detumble along the roll axis."""
+    requires_connection = True
+
     def __init__(self, conn, **env_args):
         # self.set_telemetry(conn)
         # self.pre_launch_setup()
         self.conn = conn
         self.quicksave_name = env_args.get("quicksave_name", "1U_2k")
+        self.num_active_fins = env_args.get("num_active_fins", 2)
+        # game seconds per step; if set, step waits on the game clock so that
+        # each action is held for a fixed simulated dt, whatever the wall-clock pace
+        self.step_interval = env_args.get("step_interval", None)
+        # 0 to 3; KSP runs the physics up to 4 times faster than real time
+        self.physics_warp_factor = env_args.get("physics_warp_factor", 0)
+        self.poll_interval = env_args.get("poll_interval", 0.001)        # wall-clock s
+        self.num_overruns = 0
+
+        # the ut stream and the body's reference frame survive a quicksave load,
+        # so they are set up once; the streams bound to the vessel are not
+        self.ut = None
+        self.non_rotating_reference_frame = None
+        self.vessel_streams = []
+        self.num_resets = 0
+        self.reset_time = {'remove_streams': 0.0, 'load': 0.0, 'telemetry': 0.0, 'setup': 0.0}
 
     def _set_telemetry(self):
         self.vessel = self.conn.space_center.active_vessel
-        self.non_rotating_reference_frame = self.vessel.orbit.body.non_rotating_reference_frame
+        if self.non_rotating_reference_frame is None:
+            self.non_rotating_reference_frame = self.vessel.orbit.body.non_rotating_reference_frame
+            self.ut = self.conn.add_stream(getattr, self.conn.space_center, "ut")
 
         # Setting up streams for telemetry
-        self.ut = self.conn.add_stream(getattr, self.conn.space_center, "ut")
-        self.pitch = self.conn.add_stream(getattr, self.vessel.flight(), "pitch")
-        self.heading = self.conn.add_stream(getattr, self.vessel.flight(), "heading")
-        self.roll = self.conn.add_stream(getattr, self.vessel.flight(), "roll")
+        flight = self.vessel.flight()
+        self.pitch = self.conn.add_stream(getattr, flight, "pitch")
+        self.heading = self.conn.add_stream(getattr, flight, "heading")
+        self.roll = self.conn.add_stream(getattr, flight, "roll")
+        self.surface_altitude = self.conn.add_stream(getattr, flight, "surface_altitude")
+        # the angular velocity is transformed to the vessel frame locally, with
+        # the vessel's rotation, instead of calling transform_direction every step
+        self.angular_velocity = self.conn.add_stream(self.vessel.angular_velocity,
+                                                     self.non_rotating_reference_frame)
+        self.rotation = self.conn.add_stream(self.vessel.rotation, self.non_rotating_reference_frame)
+        self.vessel_streams = [self.pitch, self.heading, self.roll, self.surface_altitude,
+                               self.angular_velocity, self.rotation]
+
+    def _remove_vessel_streams(self):
+        """Removes the streams bound to the current vessel, which a quicksave load invalidates."""
+        for stream in self.vessel_streams:
+            stream.remove()
+        self.vessel_streams = []
+
+    def close(self):
+        """Removes all the streams of the environment."""
+        try:
+            self._remove_vessel_streams()
+            if self.ut is not None:
+                self.ut.remove()
+        except OSError:
+            # the streams of a dropped connection are gone with it
+            self.vessel_streams = []
+        self.ut = None
+        self.non_rotating_reference_frame = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # the connection may be pooled and outlive the environment, so the
+        # streams are removed even if the run failed
+        self.close()
 
     def _pre_launch_setup(self):
-        self.vessel.control.sas = False
-        self.vessel.control.rcs = False
+        control = self.vessel.control
+        control.sas = False
+        control.rcs = False
 
-        self.vessel.parts.with_name('Grid Fin S')[0].modules[1].set_field_bool('Deploy', True)
-        self.vessel.parts.with_name('Grid Fin S')[1].modules[1].set_field_bool('Deploy', True)
+        # every part and module access is a remote call, so the fin modules are resolved once per reset
+        fins = self.vessel.parts.with_name('Grid Fin S')[:self.num_active_fins]
+        self.fin_modules = [fin.modules[1] for fin in fins]
+        for module in self.fin_modules:
+            module.set_field_bool('Deploy', True)
+        self.deploy_angle = None
 
     def get_state(self):
         state = [
@@ -48,19 +123,37 @@ class RollingPayloadEnv():
         termination = False
 
         self._apply_action(action)
+        if self.step_interval:
+            self._wait_for_next_step()
 
-        angvel = self.vessel.angular_velocity(self.non_rotating_reference_frame)
-        self.rate_of_roll = self.conn.space_center.transform_direction(angvel, self.non_rotating_reference_frame, self.vessel.reference_frame)[1]
+        angvel = rotate_to_local_frame(self.rotation(), self.angular_velocity())
+        self.rate_of_roll = angvel[1]
         state = self.get_state()
         reward = self.compute_reward()
         # self.conn.ui.message("Reward: " + str(round(reward, 2)), duration=0.2)
 
-        if self.vessel.flight().surface_altitude < 500:
+        if self.surface_altitude() < 500:
             termination = True
             state = self.reset(seed=0)
 
         return state, reward, termination
 
+    def _wait_for_next_step(self):
+        """
+        Waits on the ut stream until the game clock reaches the end of the
+        current step. The steps are on a fixed grid of game time; if a step
+        overran the next one (e.g., because of a slow agent), the grid is
+        restarted from the current time and the overrun is counted.
+        """
+        ut = self.ut()
+        while ut < self.next_step_ut:
+            time.sleep(self.poll_interval)
+            ut = self.ut()
+        self.next_step_ut += self.step_interval
+        if ut >= self.next_step_ut:
+            self.num_overruns += 1
+            self.next_step_ut = ut + self.step_interval
+
     def _apply_action(self, action):
         """
         0: neutral position
@@ -78,16 +171,25 @@ class RollingPayloadEnv():
             deploy_angle = 30
         else:
             deploy_angle = 0
-        
-        ### only setting a pair of gridfins for now
-        for i in range(2):
-            self.vessel.parts.with_name('Grid Fin S')[i].modules[1].set_field_float('Deploy Angle', deploy_angle)
+
+        self._set_fin_angle(deploy_angle)
+
+    def _set_fin_angle(self, deploy_angle):
+        """Sends the deploy angle to the active fins, only if it has changed."""
+        if deploy_angle == self.deploy_angle:
+            return
+        for module in self.fin_modules:
+            module.set_field_float('Deploy Angle', deploy_angle)
+        self.deploy_angle = deploy_angle
 
     def reset(self, seed):
         """
         :return: state
         """
 
+        start_time = time.perf_counter()
+        self._remove_vessel_streams()
+        load_time = time.perf_counter()
         try:
             self.conn.space_center.load(self.quicksave_name)
         except Exception as ex:
@@ -97,11 +199,23 @@ class RollingPayloadEnv():
         # time.sleep(0.1)     # TODO: remove/reduce this for actual experiments
 
         # game is loaded and we need to reset the telemetry
+        telemetry_time = time.perf_counter()
         self._set_telemetry()
+        setup_time = time.perf_counter()
         self._pre_launch_setup()
-        self.conn.space_center.physics_warp_factor = 0
+        self.conn.space_center.physics_warp_factor = self.physics_warp_factor
+        end_time = time.perf_counter()
+
+        # cumulative wall-clock time of each phase of the resets
+        self.reset_time['remove_streams'] += load_time - start_time
+        self.reset_time['load'] += telemetry_time - load_time
+        self.reset_time['telemetry'] += setup_time - telemetry_time
+        self.reset_time['setup'] += end_time - setup_time
+        self.num_resets += 1
         self.rate_of_roll = 0
         self.previous_roll = 0
+        if self.step_interval:
+            self.next_step_ut = self.ut() + self.step_interval
 
         state = self.get_state()
         return state
@@ -116,13 +230,12 @@ class RollingPayloadEnvContinuous(RollingPayloadEnv):
         action: angle of rotation in degrees
         """
         assert action >= -45 and action <= 45, "angle should be between -45 and 45 degrees"
-        
-        ### only setting a pair of gridfins for now
-        for i in range(2):
-            self.vessel.parts.with_name('Grid Fin S')[i].modules[1].set_field_float('Deploy Angle', action)
+        self._set_fin_angle(action)
 
 
 if __name__ == "__main__":
+    import krpc
+
     conn = krpc.connect(name="TestConnection")
     env = RollingPayloadEnv(conn, quicksave_name="1U_2k")
     state = env.reset(seed=0)
@@ -0,0 +1,226 @@
+"""
+This file implements a local simulation of the de-rolling payload task,
+with the same interface as the KSP environments in rolling_payload.py,
+built on the roll and drag models in models/PID.
+
+Running the module reports the steps per second of the single and the
+vectorized simulator. Run it from the root of the repository:
+
+    python -m env.simulated_payload
+"""
+
+import math
+import random
+import numpy as np
+from models.PID.drag import Drag
+from models.PID.process import Process
+
+
+class SimulatedPayloadEnv():
+    """
+    A simulated version of RollingPayloadEnv that does not need KSP or kRPC.
+
+    Each step holds the commanded grid-fin angle for sim_dt seconds. The
+    drag on the deflected fins produces a roll torque, which is integrated
+    into the roll rate by models.PID.process.Process. The roll rate is also
+    damped and perturbed by Gaussian noise. The payload descends at a
+    constant rate and the episode terminates below termination_altitude.
+    """
+    requires_connection = False
+
+    def __init__(self, conn=None, **env_args):
+        # conn is unused; it is only accepted to match RollingPayloadEnv
+        self.conn = conn
+        self.sim_dt = env_args.get("sim_dt", 0.5)                        # s per step
+        self.inertia = env_args.get("inertia", 0.5)                      # kg m^2 about the roll axis
+        self.fin_area = env_args.get("fin_area", 0.1 * 0.1)              # m^2 per fin
+        self.fin_lever_arm = env_args.get("fin_lever_arm", 0.1)          # m
+        self.fin_effectiveness = env_args.get("fin_effectiveness", 1.0)
+        self.num_fins = env_args.get("num_fins", 2)
+        self.roll_damping = env_args.get("roll_damping", 0.1)            # 1/s
+        self.roll_noise = env_args.get("roll_noise", 0.05)               # rad/s per step
+        self.initial_roll_rate = env_args.get("initial_roll_rate", 5.0)  # rad/s
+        self.initial_roll_rate_noise = env_args.get("initial_roll_rate_noise", 1.0)
+        self.initial_altitude = env_args.get("initial_altitude", 9000.0)  # m
+        self.descent_rate = env_args.get("descent_rate", 33.0)           # m/s
+        self.termination_altitude = env_args.get("termination_altitude", 500.0)
+
+        self.physics = Drag()
+        self.process = Process(self.physics)
+        # the process adds drag(u) to the roll rate, so this turns a deflected
+        # fin area into the change of roll rate over one step
+        self._area_to_u = self.fin_lever_arm * self.sim_dt / self.inertia
+        self.rng = random.Random(0)
+        self.deploy_angle = 0
+
+    def get_state(self):
+        state = [
+            self.rate_of_roll,
+        ]
+        return state
+
+    def compute_reward(self):           # maximum reward at zero roll rate
+        return -abs(self.rate_of_roll)
+
+    def step(self, action):
+        termination = False
+
+        self._apply_action(action)
+
+        effective_area = (self.num_fins * self.fin_area * self.fin_effectiveness
+                          * math.sin(math.radians(self.deploy_angle)))
+        self.process.step(effective_area * self._area_to_u)
+        self.process.roll *= 1 - self.roll_damping * self.sim_dt
+        self.process.roll += self.rng.gauss(0, self.roll_noise)
+        self.rate_of_roll = self.process.roll
+        self.altitude -= self.descent_rate * self.sim_dt
+
+        state = self.get_state()
+        reward = self.compute_reward()
+
+        if self.altitude < self.termination_altitude:
+            termination = True
+            state = self.reset(seed=self.rng.randrange(2 ** 31))
+
+        return state, reward, termination
+
+    def _apply_action(self, action):
+        """
+        0: neutral position
+        1: turn in one direction
+        2: turn in the other direction
+        """
+        if action == 2:
+            self.deploy_angle = -30
+        elif action == 1:
+            self.deploy_angle = 30
+        else:
+            self.deploy_angle = 0
+
+    def reset(self, seed):
+        """
+        :return: state
+        """
+        self.rng.seed(seed)
+        self.rate_of_roll = self.initial_roll_rate + self.rng.gauss(0, self.initial_roll_rate_noise)
+        self.process.set_initial_conditions(self.rate_of_roll)
+        self.altitude = self.initial_altitude
+        self.deploy_angle = 0
+
+        state = self.get_state()
+        return state
+
+
+class SimulatedPayloadEnvContinuous(SimulatedPayloadEnv):
+    def __init__(self, conn=None, **env_args):
+        super().__init__(conn, **env_args)
+
+    def _apply_action(self, action):
+        """
+        action: angle of rotation in degrees
+        """
+        assert action >= -45 and action <= 45, "angle should be between -45 and 45 degrees"
+        self.deploy_angle = action
+
+
+class VectorizedPayloadEnv(SimulatedPayloadEnv):
+    """
+    Simulates num_envs independent payloads in lockstep with NumPy, using the
+    same physics and parameters as SimulatedPayloadEnv.
+
+    The roll rates, fin angles and altitudes are arrays with one entry per
+    payload. step takes an array of actions and returns a (num_envs, 1)
+    array of states and arrays of rewards and termination flags. Terminated
+    payloads are reset automatically, so their returned state is the first
+    state of their next episode, as with the single environment.
+    """
+
+    def __init__(self, conn=None, **env_args):
+        super().__init__(conn, **env_args)
+        self.num_envs = env_args.get("num_envs", env_args.get("num_runs", 1))
+        # Drag.drag is linear in the area, so one coefficient covers all payloads
+        self._rate_per_area = self.physics.drag(1.0) * self._area_to_u
+        self._fin_angles = np.array([0.0, 30.0, -30.0])
+        self.np_rng = np.random.default_rng(0)
+
+    def get_state(self):
+        return self.rate_of_roll[:, np.newaxis].copy()
+
+    def compute_reward(self):
+        return -np.abs(self.rate_of_roll)
+
+    def step(self, action):
+        self._apply_action(action)
+
+        effective_area = (self.num_fins * self.fin_area * self.fin_effectiveness
+                          * np.sin(np.radians(self.deploy_angle)))
+        self.rate_of_roll += self._rate_per_area * effective_area
+        self.rate_of_roll *= 1 - self.roll_damping * self.sim_dt
+        self.rate_of_roll += self.np_rng.normal(0, self.roll_noise, self.num_envs)
+        self.altitude -= self.descent_rate * self.sim_dt
+
+        reward = self.compute_reward()
+        termination = self.altitude < self.termination_altitude
+        if termination.any():
+            self._reset_payloads(termination)
+        state = self.get_state()
+
+        return state, reward, termination
+
+    def _apply_action(self, action):
+        """Maps each discrete action (0: neutral, 1 and 2: turn) to a fin angle."""
+        self.deploy_angle = self._fin_angles[np.asarray(action, dtype=int)]
+
+    def _reset_payloads(self, mask):
+        """Starts a new episode for the payloads selected by the boolean mask."""
+        num_resets = np.count_nonzero(mask)
+        self.rate_of_roll[mask] = (self.initial_roll_rate
+                                   + self.np_rng.normal(0, self.initial_roll_rate_noise, num_resets))
+        self.altitude[mask] = self.initial_altitude
+        self.deploy_angle[mask] = 0
+
+    def reset(self, seed):
+        """
+        :return: (num_envs, 1) array of states
+        """
+        self.np_rng = np.random.default_rng(seed)
+        self.rate_of_roll = np.zeros(self.num_envs)
+        self.altitude = np.zeros(self.num_envs)
+        self.deploy_angle = np.zeros(self.num_envs)
+        self._reset_payloads(np.ones(self.num_envs, dtype=bool))
+
+        return self.get_state()
+
+
+class VectorizedPayloadEnvContinuous(VectorizedPayloadEnv):
+    def _apply_action(self, action):
+        """
+        action: array of angles of rotation in degrees
+        """
+        action = np.asarray(action, dtype=float)
+        assert np.all((action >= -45) & (action <= 45)), "angle should be between -45 and 45 degrees"
+        self.deploy_angle = action.copy()
+
+
+if __name__ == "__main__":
+    import time
+
+    env = SimulatedPayloadEnv()
+    state = env.reset(seed=0)
+    print(f"Initial state: {state}")
+    num_steps = 100000
+    start_time = time.perf_counter()
+    for i in range(num_steps):
+        action = 1 if env.rate_of_roll < 0 else 2
+        next_state, reward, termination = env.step(action)
+    print(f"{num_steps / (time.perf_counter() - start_time):.0f} steps per second, final state {next_state}")
+
+    vec_env = VectorizedPayloadEnv(num_envs=1000)
+    states = vec_env.reset(seed=0)
+    num_steps = 1000
+    start_time = time.perf_counter()
+    for i in range(num_steps):
+        actions = np.where(vec_env.rate_of_roll < 0, 1, 2)
+        states, rewards, terminations = vec_env.step(actions)
+    print(f"{num_steps * vec_env.num_envs / (time.perf_counter() - start_time):.0f} payload steps per second "
+          f"with {vec_env.num_envs} payloads, mean reward {rewards.mean():.3f}")
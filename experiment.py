@@ -5,27 +5,60 @@ import traceback
 import sys
 import os
 import argparse
+import sqlite3
 import numpy as np
-from tqdm import tqdm
-import krpc
 from utils.sweeper import Sweeper
 from utils.helpers import validate_output_folder
+from utils.connection_pool import ConnectionPool
+from utils.result_cache import ResultCache
+from utils.sweeper import config_hash
+from utils.checkpoint import save_checkpoint, load_checkpoint, remove_checkpoint
+from utils.stream_log import StreamingLog, load_experiment_log, copy_stream_log
+from utils.results_catalog import ResultsCatalog, CATALOG
+from utils.weight_snapshots import SparseSnapshots
 from env.rolling_payload import RollingPayloadEnv, RollingPayloadEnvContinuous
-from agent.algorithms import CDiscQAgent, NaiveAgent, NaiveSmoothAgent
+from env.simulated_payload import SimulatedPayloadEnv, SimulatedPayloadEnvContinuous, \
+    VectorizedPayloadEnv, VectorizedPayloadEnvContinuous
+from agent.algorithms import CDiscQAgent, BatchCDiscQAgent, CDiscQLambdaAgent, NaiveAgent, NaiveSmoothAgent
 
 
 env_map = {
     'RollingPayload': 'RollingPayloadEnv',
     'RollingPayloadContinuous': 'RollingPayloadEnvContinuous',
-    'Dummy': 'DummyEnv'
+    'Dummy': 'SimulatedPayloadEnv',
+    'DummyContinuous': 'SimulatedPayloadEnvContinuous',
+    'DummyVectorized': 'VectorizedPayloadEnv',
+    'DummyVectorizedContinuous': 'VectorizedPayloadEnvContinuous'
     }
 agent_map = {
     'CDiscQ': 'CDiscQAgent',
+    'BatchCDiscQ': 'BatchCDiscQAgent',
+    'CDiscQLambda': 'CDiscQLambdaAgent',
     'Naive': 'NaiveAgent',
     'NaiveSmooth': 'NaiveSmoothAgent'
     }
 
 
+# one kRPC connection per server, reused by all the runs and configurations
+connection_pool = ConnectionPool()
+
+
+def get_connection(config):
+    """Returns a pooled connection to the kRPC server (or stand-in) given in the config."""
+    if config.get('krpc_stand_in', False):
+        # runs the kRPC environments without the game, e.g., to regression-test them
+        from env.krpc_stand_in import StandInConnection
+        latency = config.get('krpc_latency', 0.0)
+        return connection_pool.get(('stand-in', latency), lambda: StandInConnection(latency=latency))
+
+    import krpc
+    endpoint = (config.get('krpc_address', '127.0.0.1'),
+                config.get('krpc_rpc_port', 50000),
+                config.get('krpc_stream_port', 50001))
+    return connection_pool.get(endpoint, lambda: krpc.connect(name="Tracker", address=endpoint[0],
+                                                              rpc_port=endpoint[1], stream_port=endpoint[2]))
+
+
 def process_observation(raw_obs):
     return raw_obs
 
@@ -33,28 +66,141 @@ def process_observation(raw_obs):
 def log_data(interval, current_timestep, current_run,
              exp_type, log, env, agent, centered_values, save_weights,
              exp_name, exp_id, nonlinear):
-    if save_weights:
+    if save_weights and isinstance(log, StreamingLog):
+        log.append('weights', agent.weights)
+        log.append('avgrew', agent.avg_reward)
+    elif save_weights:
         index = current_timestep // interval
-        log['weights'][current_run][index] = agent.weights
+        if 'weights_sparse' in log:
+            log['weights_sparse'][current_run].append(agent.weights)
+        else:
+            log['weights'][current_run][index] = agent.weights
         log['avgrew'][current_run][index] = agent.avg_reward
 
 
+def log_step(log, run, t, reward, action, next_obs, term_flag):
+    if isinstance(log, StreamingLog):
+        log.append('reward', reward)
+        log.append('action', action)
+        log.append('next_obs', next_obs)
+        log.append('term', term_flag)
+    else:
+        log['reward'][run][t] = reward
+        log['action'][run][t] = action
+        log['obs'][run][t + 1] = next_obs
+        log['term'][run][t] = term_flag
+
+
 def save_final_weights(nonlinear, run_idx, log, agent, exp_name, exp_id):
     if nonlinear:
         agent.save_trained_model(f'{exp_name}_{exp_id}_{run_idx}')
+    elif isinstance(log, StreamingLog):
+        log.append('weights_final', agent.weights)
     else:
         log['weights_final'][run_idx] = agent.weights
-    if hasattr(agent, "avg_reward"):
+    if hasattr(agent, "avg_reward") and isinstance(log, StreamingLog):
+        log.append('avgrew_final', agent.avg_reward)
+    elif hasattr(agent, "avg_reward"):
         log['avgrew_final'][run_idx] = agent.avg_reward
 
 
 def print_experiment_summary(log, exp_type):
+    from tqdm import tqdm
+
     if exp_type == 'control':
         tqdm.write('RewardRate_total\t= %f' % (np.mean(log['reward'])))
         tqdm.write('RewardRate_last50%%\t= %f\n' % np.mean(log['reward'][:, log['reward'].shape[1] // 2:]))
         tqdm.write('RewardRate_last10%%\t= %f\n' % np.mean(log['reward'][:, log['reward'].shape[1] // 10 * 9:]))
 
 
+def initialize_stream_log(config):
+    """
+    Returns a streaming log, in the output folder, for the quantities logged
+    in an experiment. It is used instead of the in-memory arrays of
+    initialize_log when the log_format is 'stream'.
+    """
+    assert config.get('weights_snapshot_format', 'dense') == 'dense', \
+        'streaming logs store dense weight snapshots'
+    folder = f"{config['output_folder']}{config['exp_name']}_{config['exp_id']}_log"
+    dtypes = {field: np.float32 for field in ['reward', 'action', 'next_obs', 'start_obs', 'start_action',
+                                              'weights', 'avgrew', 'weights_final', 'avgrew_final',
+                                              'resume_obs']}
+    dtypes['term'] = bool
+    dtypes['resume_at'] = np.int64
+    return StreamingLog(folder, dtypes=dtypes, chunk_size=config.get('log_chunk_size', 4096),
+                        num_runs=config['num_runs'], num_max_steps=config['num_max_steps'],
+                        eval_every_n_steps=config['eval_every_n_steps'])
+
+
+def initialize_log(config):
+    """Returns a dictionary of zeroed arrays for the quantities logged in an experiment."""
+    num_runs = config['num_runs']
+    max_steps = config['num_max_steps']
+    eval_every_n_steps = config['eval_every_n_steps']
+    num_weights = config['num_weights']
+
+    log = {'reward': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
+           'angle': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
+           'action': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
+           'start_action': np.zeros(num_runs, dtype=np.float32),
+           'term': np.zeros((num_runs, max_steps + 1), dtype=bool),
+           'weights_final': np.zeros((num_runs, num_weights), dtype=np.float32),
+           'avgrew_final': np.zeros(num_runs, dtype=np.float32),
+           }
+    if config.get('save_weights', 0):
+        log['avgrew'] = np.zeros((num_runs, max_steps // eval_every_n_steps + 1), dtype=np.float32)
+        if config.get('weights_snapshot_format', 'dense') == 'sparse':
+            # a base vector plus the weights changed since the previous snapshot;
+            # converted to plain arrays by finalize_log
+            log['weights_sparse'] = [SparseSnapshots(num_weights) for _ in range(num_runs)]
+        else:
+            log['weights'] = np.zeros((num_runs, max_steps // eval_every_n_steps + 1,
+                                    num_weights), dtype=np.float32)
+    if config.get('store_max_action_values', False):
+        log['max_value_per_step'] = np.zeros((num_runs, max_steps // 10 + 1), dtype=np.float32)
+    return log
+
+
+def log_resume(log, run, t, obs, action):
+    """Logs the first observation and action of the episode a run continued with at step t."""
+    if isinstance(log, StreamingLog):
+        log.append('resume_at', [run, t, action])
+        log.append('resume_obs', obs)
+    else:
+        log.setdefault('resume_at', []).append([run, t, action])
+        log.setdefault('resume_obs', []).append(np.asarray(obs, dtype=np.float32))
+
+
+def resume_episode(env, agent, log, run, t, config):
+    """
+    Continues a run at step t from the first observation of a new episode,
+    e.g., after a checkpoint or a reconnection, keeping the agent's step
+    sizes (start would reinitialize them).
+
+    Returns:
+        action: the agent's first action in the new episode
+    """
+    obs = env.reset(seed=config['rng_seed'])
+    step_size_state = [getattr(agent, name, None) for name in ['alpha', 'beta', 'timestep']]
+    action = agent.resume(process_observation(obs))
+    assert step_size_state == [getattr(agent, name, None) for name in ['alpha', 'beta', 'timestep']], \
+        'resuming changed the step sizes'
+    # log['obs'][run][t] is the next observation of the last logged transition,
+    # so the first observation of the new episode is logged apart
+    log_resume(log, run, t, obs, action)
+    return action
+
+
+def finalize_log(log):
+    """Converts the log's sparse weight snapshots and resumes, if any, to plain arrays for np.save."""
+    if 'weights_sparse' in log:
+        log['weights_sparse'] = [snapshots.to_dict() for snapshots in log['weights_sparse']]
+    if 'resume_at' in log:
+        log['resume_at'] = np.array(log['resume_at'], dtype=np.int64)
+        log['resume_obs'] = np.array(log['resume_obs'], dtype=np.float32)
+    return log
+
+
 def run_experiment_one_config(config):
     """
     Runs N independent experiments for a particular parameter configuration.
@@ -64,6 +210,9 @@ def run_experiment_one_config(config):
     Returns:
         log: a dictionary of quantities of interest
     """
+    # imported here so that importing this module (e.g., for its helpers) stays fast
+    from tqdm import tqdm
+
     exp_name = config['exp_name']
     exp_type = config['exp_type']
     env_name = config['env_name']
@@ -72,102 +221,306 @@ def run_experiment_one_config(config):
     max_steps = config['num_max_steps']
     eval_every_n_steps = config['eval_every_n_steps']
     save_weights = config.get('save_weights', 0)
-    num_weights = config['num_weights']
-    store_max_action_values = config.get('store_max_action_values', False)
-
-    log = {'reward': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
-           'angle': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
-           'action': np.zeros((num_runs, max_steps + 1), dtype=np.float32),
-           'weights_final': np.zeros((num_runs, num_weights), dtype=np.float32),
-           'avgrew_final': np.zeros(num_runs, dtype=np.float32),
-           }
-    if save_weights:
-        log['avgrew'] = np.zeros((num_runs, max_steps // eval_every_n_steps + 1), dtype=np.float32)
-        log['weights'] = np.zeros((num_runs, max_steps // eval_every_n_steps + 1,
-                                num_weights), dtype=np.float32)
-    if store_max_action_values:
-        log['max_value_per_step'] = np.zeros((num_runs, max_steps // 10 + 1), dtype=np.float32)
+    # wall-clock pause between steps to let the game advance; 0 for simulators
+    # and for kRPC environments that wait on the game clock (step_interval)
+    step_delay = config.get('step_delay', 0 if config.get('step_interval') else 0.5)
+    # steps between checkpoints of the agent, the simulator, and the partial log; 0 for none
+    checkpoint_every_n_steps = config.get('checkpoint_every_n_steps', 0)
 
     assert env_name in env_map, f'{env_name} not found.'
     assert agent_name in agent_map, f'{agent_name} not found.'
+    if getattr(getattr(sys.modules[__name__], agent_map[agent_name]), 'batched', False):
+        return run_batch_experiment_one_config(config)
+
+    # resumes from the checkpoint of an identical configuration with the same
+    # exp_id, if there is one; the exp_id keeps apart the checkpoints of
+    # identical configurations that sweep workers run at the same time
+    checkpoint_file = (f"{config.get('output_folder', '')}"
+                       f"checkpoint_{config_hash(config)}_{config.get('exp_id', 0)}.pkl")
+    checkpoint = load_checkpoint(checkpoint_file) if checkpoint_every_n_steps else None
+    if checkpoint is not None:
+        print(f"Resuming from run {checkpoint['run']}, step {checkpoint['t']} of {checkpoint_file}")
+        log = checkpoint['log']
+    elif config.get('log_format', 'npy') == 'stream':
+        log = initialize_stream_log(config)
+    else:
+        log = initialize_log(config)
 
-    for run in range(num_runs):
+    for run in range(checkpoint['run'] if checkpoint else 0, num_runs):
         config['rng_seed'] = run
-        agent = getattr(sys.modules[__name__], agent_map[agent_name])(**config)
-        env = getattr(sys.modules[__name__], env_map[env_name])(krpc.connect(name="Tracker"), **config)
-        obs = env.reset(seed=config['rng_seed'])
-        action = agent.start(process_observation(obs))
-
-        for t in tqdm(range(max_steps + 1)):
-            # logging relevant data at regular intervals
-            if t % eval_every_n_steps == 0:
-                log_data(interval=eval_every_n_steps, current_timestep=t,
-                         current_run=run, exp_type=exp_type, log=log,
-                         env=env, agent=agent,
-                         save_weights=save_weights, nonlinear=False,
-                         exp_name=exp_name, exp_id=config['exp_id'],
-                         centered_values=None)
-            # the environment and agent step
-            next_obs, reward, term_flag = env.step(action)
-            action = agent.step(reward, process_observation(next_obs), term_flag)
-            # if t % 10 == 0:
-            # print(action, reward, term_flag, next_obs)
-            # logging the reward at each step
-            log['reward'][run][t] = reward
-            # logging some data for debugging
-            log['action'][run][t] = action
-            # log['angle'][run][t] = np.arctan2(next_obs[0], next_obs[1])     # this is the *next* angle
-            time.sleep(0.5)
-            # print(np.rad2deg(np.arctan2(next_obs[0], next_obs[1])), env.roll())
+        env_class = getattr(sys.modules[__name__], env_map[env_name])
+        conn = get_connection(config) if env_class.requires_connection else None
+        start_step = 0
+        env = None
+        reconnected = False
+        try:
+            if checkpoint is not None and checkpoint['agent'] is not None:
+                start_step = checkpoint['t']
+                agent = checkpoint['agent']
+                # pickling does not keep weights_matrix a view of the weights
+                agent._set_weights(agent.weights)
+                if checkpoint['env'] is not None:
+                    env, action = checkpoint['env'], checkpoint['action']
+                else:
+                    # the game cannot be restored, so the run continues from a new episode
+                    env = env_class(conn, **config)
+                    action = resume_episode(env, agent, log, run, start_step, config)
+            else:
+                agent = getattr(sys.modules[__name__], agent_map[agent_name])(**config)
+                env = env_class(conn, **config)
+                obs = env.reset(seed=config['rng_seed'])
+                action = agent.start(process_observation(obs))
+                # the observations are logged for offline training; obs[t+1] is the *next* observation at step t
+                if isinstance(log, StreamingLog):
+                    log.append('start_obs', obs)
+                    log.append('start_action', action)
+                else:
+                    if 'obs' not in log:
+                        log['obs'] = np.zeros((num_runs, max_steps + 2, len(obs)), dtype=np.float32)
+                    log['obs'][run][0] = obs
+                    log['start_action'][run] = action
+            checkpoint = None
+
+            for t in tqdm(range(start_step, max_steps + 1)):
+                # logging relevant data at regular intervals
+                if t % eval_every_n_steps == 0:
+                    log_data(interval=eval_every_n_steps, current_timestep=t,
+                             current_run=run, exp_type=exp_type, log=log,
+                             env=env, agent=agent,
+                             save_weights=save_weights, nonlinear=False,
+                             exp_name=exp_name, exp_id=config['exp_id'],
+                             centered_values=None)
+                # the environment and agent step
+                try:
+                    next_obs, reward, term_flag = env.step(action)
+                except OSError:
+                    # the pool checks a connection only when it is handed out, so a connection
+                    # that drops mid-run is reopened here, once per run, and the run continues
+                    # from a new episode
+                    if conn is None or reconnected:
+                        raise
+                    reconnected = True
+                    tqdm.write(f'Reconnecting at step {t} of run {run}')
+                    # the pool hands back the same connection if it still answers,
+                    # so the old environment's streams are removed first (close
+                    # tolerates a connection that is gone)
+                    env.close()
+                    conn = get_connection(config)
+                    env = env_class(conn, **config)
+                    action = resume_episode(env, agent, log, run, t, config)
+                    next_obs, reward, term_flag = env.step(action)
+                action = agent.step(reward, process_observation(next_obs), term_flag)
+                # if t % 10 == 0:
+                # print(action, reward, term_flag, next_obs)
+                # logging the reward, and some data for debugging, at each step
+                log_step(log, run, t, reward, action, next_obs, term_flag)
+                # log['angle'][run][t] = np.arctan2(next_obs[0], next_obs[1])     # this is the *next* angle
+                if step_delay:
+                    time.sleep(step_delay)
+                # print(np.rad2deg(np.arctan2(next_obs[0], next_obs[1])), env.roll())
+                if checkpoint_every_n_steps and (t + 1) % checkpoint_every_n_steps == 0:
+                    save_checkpoint(checkpoint_file,
+                                    {'run': run, 't': t + 1, 'agent': agent, 'action': action, 'log': log,
+                                     # a connected environment is restarted instead
+                                     'env': None if env_class.requires_connection else env})
+        finally:
+            if conn is not None and env is not None:
+                # the connection outlives the run, so the run's streams are removed, even if it failed
+                env.close()
 
         save_final_weights(nonlinear=False,
                            run_idx=run, log=log, agent=agent,
                            exp_name=exp_name, exp_id=config['exp_id'])
+        if conn is not None:
+            tqdm.write('kRPC_connections\t= ' + connection_pool.summary())
+        if getattr(env, 'num_resets', 0):
+            tqdm.write('Reset_time_ms\t= ' + ', '.join(f'{phase} {t / env.num_resets * 1000:.1f}'
+                                                      for phase, t in env.reset_time.items()))
+        if getattr(env, 'num_overruns', 0):
+            tqdm.write('Step_overruns\t= %d' % env.num_overruns)
+        if getattr(agent, 'tilecoder', False) and agent.tilecoder.track_collisions:
+            tqdm.write('TileCoder_collision_rate\t= %f' % agent.tilecoder.collision_rate)
+        if isinstance(log, StreamingLog):
+            # the finished runs are on disk
+            log.flush()
+        if checkpoint_every_n_steps:
+            save_checkpoint(checkpoint_file, {'run': run + 1, 't': 0, 'agent': None, 'action': None,
+                                              'log': log, 'env': None})
 
-    print_experiment_summary(log, exp_type)
+    remove_checkpoint(checkpoint_file)
+    if isinstance(log, StreamingLog):
+        log.close(params=config)
+        print_experiment_summary(load_experiment_log(log.folder, fields=['reward', 'weights_final']), exp_type)
+    else:
+        finalize_log(log)
+        print_experiment_summary(log, exp_type)
     return log
 
 
-parser = argparse.ArgumentParser(description="Run an experiment based on parameters specified in a configuration file")
-parser.add_argument('--config-file',  # required=True,
-                    default='config_files/pendulum/test.json',
-                    help='location of the config file for the experiment (e.g., config_files/test_config.json)')
-parser.add_argument('--cfg-start', default=0)
-parser.add_argument('--cfg-end', default=-1)
-parser.add_argument('--output-path', default='results/test_exp/')
-args = parser.parse_args()
-print(args.config_file, args.output_path)
-path = validate_output_folder(args.output_path)
+def run_batch_experiment_one_config(config):
+    """
+    Runs the N independent experiments of a parameter configuration in
+    lockstep, with a batched agent (e.g., BatchCDiscQAgent) and a vectorized
+    environment (e.g., VectorizedPayloadEnv) that step all the runs at once.
+
+    Args:
+        config: a dictionary of all the experiment parameters
+    Returns:
+        log: a dictionary of quantities of interest, as for run_experiment_one_config
+    """
+    from tqdm import tqdm
+
+    # the batched loop keeps its whole log in memory and runs in one go
+    assert config.get('log_format', 'npy') != 'stream', \
+        "log_format 'stream' is not supported with a batched agent"
+    assert not config.get('checkpoint_every_n_steps', 0), \
+        'checkpoint_every_n_steps is not supported with a batched agent'
+
+    exp_type = config['exp_type']
+    num_runs = config['num_runs']
+    max_steps = config['num_max_steps']
+    eval_every_n_steps = config['eval_every_n_steps']
+    save_weights = config.get('save_weights', 0)
 
-sweeper = Sweeper(args.config_file)
-cfg_start_idx = int(args.cfg_start)
-cfg_end_idx = int(args.cfg_end) if args.cfg_end != -1 else sweeper.total_combinations
+    env_class = getattr(sys.modules[__name__], env_map[config['env_name']])
+    config['rng_seed'] = 0
+    agent = getattr(sys.modules[__name__], agent_map[config['agent_name']])(**config)
+    env = env_class(None, **config)
+    assert getattr(env, 'num_envs', 1) == num_runs, 'batched agents need a vectorized simulator'
 
-print(f'\n\nRunning configurations {cfg_start_idx} to {cfg_end_idx}...\n\n')
+    log = initialize_log(config)
+    obs = env.reset(seed=config['rng_seed'])
+    action = agent.start(obs)
+    log['obs'] = np.zeros((num_runs, max_steps + 2, obs.shape[1]), dtype=np.float32)
+    log['obs'][:, 0] = obs
+    log['start_action'][:] = action
 
-start_time = time.time()
+    for t in tqdm(range(max_steps + 1)):
+        if save_weights and t % eval_every_n_steps == 0:
+            index = t // eval_every_n_steps
+            if 'weights_sparse' in log:
+                for run, snapshots in enumerate(log['weights_sparse']):
+                    snapshots.append(agent.weights[run])
+            else:
+                log['weights'][:, index] = agent.weights
+            log['avgrew'][:, index] = agent.avg_reward
+        next_obs, reward, term_flag = env.step(action)
+        action = agent.step(reward, next_obs, term_flag)
+        log['reward'][:, t] = reward
+        log['action'][:, t] = action
+        log['obs'][:, t + 1] = next_obs
+        log['term'][:, t] = term_flag
 
-for i in range(cfg_start_idx, cfg_end_idx):
-    config = sweeper.get_one_config(i)
-    config['exp_id'] = i
-    config['output_folder'] = path
-    # print(f'Starting at: {time.localtime(start_time)}')
-    print(config)
+    log['weights_final'][:] = agent.weights
+    log['avgrew_final'][:] = agent.avg_reward
+    if agent.tilecoder and agent.tilecoder.track_collisions:
+        tqdm.write('TileCoder_collision_rate\t= %f' % agent.tilecoder.collision_rate)
+
+    finalize_log(log)
+    print_experiment_summary(log, exp_type)
+    return log
+
+
+def run_and_save_one_config(config, path, use_cache=True):
+    """
+    Runs one parameter configuration and saves its log in the output folder.
+
+    With use_cache, a configuration identical to one whose log is already in
+    the output folder's result cache is not run again; the cached log is
+    saved under this configuration's name (if different) instead.
+
+    Returns:
+        error: None if the configuration ran successfully, the traceback otherwise
+    """
+    filename = f"{config['exp_name']}_{config['exp_id']}"
+    cache = ResultCache(path)
+    cached_filename = cache.lookup(config) if use_cache else None
+    if cached_filename is not None:
+        print(f'Found an identical configuration in: {cached_filename}, skipping\n')
+        if os.path.isdir(cached_filename):
+            if cached_filename != f'{path}{filename}_log':
+                copy_stream_log(cached_filename, f'{path}{filename}_log', params=config)
+                add_to_catalog(path, f'{filename}_log')
+        elif cached_filename != f'{path}{filename}.npy':
+            log = np.load(cached_filename, allow_pickle=True).item()
+            log['params'] = config
+            np.save(f'{path}{filename}', log)
+            add_to_catalog(path, f'{filename}.npy', log)
+        return None
 
     try:
         log = run_experiment_one_config(config)
-        log['params'] = config
     except Exception as e:
         print('\n***\n')
         print(traceback.format_exc())
         print('***\nException occurred with this parameter configuration, moving on now\n***\n')
-    else:
-        filename = f"{config['exp_name']}_{config['exp_id']}"
-        print(f'Saving experiment log in: {filename}.npy\n**********\n')
-        np.save(f'{path}{filename}', log)
+        return traceback.format_exc()
+    if isinstance(log, StreamingLog):
+        print(f'Experiment log streamed to: {filename}_log\n**********\n')
+        cache.add(config, f'{filename}_log')
+        add_to_catalog(path, f'{filename}_log')
+        return None
+    log['params'] = config
+    print(f'Saving experiment log in: {filename}.npy\n**********\n')
+    np.save(f'{path}{filename}', log)
+    cache.add(config, f'{filename}.npy')
+    add_to_catalog(path, f'{filename}.npy', log)
+    return None
+
+
+def add_to_catalog(path, filename, log=None):
+    """
+    Adds a saved log (loaded if not given) to the output folder's results
+    catalog. The log is saved already, so a catalog error (e.g., a database
+    locked for too long) is reported instead of failing the run; a later
+    scan of the folder adds the log.
+    """
+    catalog = None
+    try:
+        catalog = ResultsCatalog(path + CATALOG)
+        catalog.add(path + filename, log)
+    except sqlite3.Error as ex:
+        print(f'Could not add {filename} to the results catalog: {type(ex).__name__}: {ex}')
     finally:
+        if catalog is not None:
+            catalog.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an experiment based on parameters specified in a configuration file")
+    parser.add_argument('--config-file',  # required=True,
+                        default='config_files/pendulum/test.json',
+                        help='location of the config file for the experiment (e.g., config_files/test_config.json)')
+    parser.add_argument('--cfg-start', default=0)
+    parser.add_argument('--cfg-end', default=-1)
+    parser.add_argument('--output-path', default='results/test_exp/')
+    parser.add_argument('--rerun', action='store_true',
+                        help='run the configurations even if identical ones have been run before')
+    args = parser.parse_args()
+    print(args.config_file, args.output_path)
+    path = validate_output_folder(args.output_path)
+
+    sweeper = Sweeper(args.config_file)
+    cfg_start_idx = int(args.cfg_start)
+    cfg_end_idx = int(args.cfg_end) if args.cfg_end != -1 else sweeper.total_combinations
+
+    print(f'\n\nRunning configurations {cfg_start_idx} to {cfg_end_idx}...\n\n')
+
+    start_time = time.time()
+
+    for i, config in sweeper.iter_configs(cfg_start_idx, cfg_end_idx):
+        config['exp_id'] = i
+        config['output_folder'] = path
+        # print(f'Starting at: {time.localtime(start_time)}')
+        print(config)
+
+        run_and_save_one_config(config, path, use_cache=not args.rerun)
         print("Time elapsed: {:.2} minutes\n\n".format((time.time() - start_time) / 60))
         os.system('sleep 0.5')
 
-end_time = time.time()
-print("Total time elapsed: {:.2} minutes".format((end_time - start_time) / 60))
+    end_time = time.time()
+    print("Total time elapsed: {:.2} minutes".format((end_time - start_time) / 60))
+
+
+if __name__ == '__main__':
+    main()
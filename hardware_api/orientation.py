@@ -1,8 +1,3 @@
-import time
-import board
-import adafruit_icm20x
-from gpiozero import AngularServo
-from time import sleep 
 import math 
 
 
@@ -10,14 +5,25 @@ counterclockwise = -1
 still = 0
 clockwise = 1
 
-i2c = board.I2C()
-icm = adafruit_icm20x.ICM20649(board.I2C())
+# the IMU is only set up on first use, so importing this module stays cheap
+_icm = None
+
+def get_icm():
+    """Returns the ICM20649 IMU, opening the I2C bus on the first call."""
+    global _icm
+    if _icm is None:
+        import board
+        import adafruit_icm20x
+        _icm = adafruit_icm20x.ICM20649(board.I2C())
+    return _icm
 
 def rad_to_deg(rad):
     return rad * 180/math.pi
 
 class Payload:
     def __init__(self):
+        from gpiozero import AngularServo
+
         self.acceleration = (0, 0, 0)
         self.gyro = (0, 0, 0)
         self.roll_rate = 0
@@ -31,6 +37,7 @@ class Payload:
                             )
         
     def _update(self, acceleration, gyro):
+        icm = get_icm()
         self.acceleration = icm.acceleration
         self.roll_rate = icm.gyro[2]                            # AN: this is the roll angle, right, not the roll rate?
         self.gyro = icm.gyro     
@@ -53,7 +60,7 @@ class Payload:
             self.servo_array[i].angle = 0   
 
     def get_rollangle(self):
-        return rad_to_deg(icm.gyro[2])
+        return rad_to_deg(get_icm().gyro[2])
 
     def set_gridfin_angle(self, angle, gridfin_pair):
         for i in range(gridfin_pair*2, gridfin_pair*2 + 2):
@@ -1,13 +1,15 @@
 """Code to use the learned weights for inference."""
 
 import numpy as np
-from utils.helpers import get_weights_from_npy
-from utils.tilecoder import TileCoder
+from utils.policy_table import CompiledPolicy
 
 
 class InferenceAgent():
 
     def __init__(self, weights_file_name='results/learned_weights.npy'):
+        # only needed to set up the agent, not to import this module
+        from utils.tilecoder import TileCoder
+        from utils.weights_file import is_weights_file, load_weights_file
 
         self.num_actions = 3
         self.actions = [-1, 0, 1]
@@ -16,18 +18,32 @@ class InferenceAgent():
         self.tiling_dims = [7]
         self.limits_per_dim = [[-15, 15]]
 
+        # weights files carry their own tile-coder parameters and are memory-mapped;
+        # experiment logs carry them in their params
+        if is_weights_file(weights_file_name):
+            self.weights, header = load_weights_file(weights_file_name, mmap=True)
+        else:
+            log = np.load(weights_file_name, allow_pickle=True).item()
+            header = log.get('params', {}) if isinstance(log, dict) else {}
+            assert 'num_tilings' in header, \
+                f"{weights_file_name} has no tile-coder params (experiment logs keep them in 'params'); " \
+                'use a weights file (see utils.weights_file) instead'
+            self.weights = log['weights_final'][0]
+        self.num_actions = header.get('num_actions', self.num_actions)
+        self.num_tilings = header.get('num_tilings', self.num_tilings)
+        self.tiling_dims = header.get('tiling_dims', self.tiling_dims)
+        self.limits_per_dim = header.get('limits_per_dim', self.limits_per_dim)
+        # hashed agents index their weights by memory slot
+        self.memory_size = header.get('memory_size')
+
         self.tilecoder = TileCoder(
             tiling_dims=self.tiling_dims,
             limits_per_dim=self.limits_per_dim,
             num_tilings=self.num_tilings,
-            style='indices'
+            style='indices',
+            memory_size=self.memory_size
             )
         self.num_features = self.tilecoder.n_tiles + 1
-
-        self.weights = get_weights_from_npy(
-            filename=weights_file_name,
-            seed_idx=0
-            )
         assert self.weights.size == self.num_features * self.num_actions
 
     def _get_value(self, observation, action):
@@ -42,6 +58,71 @@ class InferenceAgent():
         action_index = np.argmax(q_s)      # can replace this with a cleverer version that matches the previous action in case of a tie
         return action_index
 
+    def compile_policy(self):
+        """
+        Compiles the greedy policy into a CompiledPolicy lookup table.
+
+        For a 1-D observation, each tiling's active tile changes only where
+        (obs - low) * norm + offset crosses an integer, so the greedy action
+        is constant between consecutive tile boundaries. The action of each
+        segment is computed once, and adjacent segments with the same action
+        are merged. Observations outside limits_per_dim get the action of
+        the nearest segment (the tile coder itself is only defined inside).
+        """
+        assert len(self.tiling_dims) == 1, 'only 1-D observations can be compiled'
+        low, high = self.limits_per_dim[0]
+        norm = self.tilecoder._norm_dims[0]
+        offsets = self.tilecoder._offsets[:, 0]
+
+        # the tile boundaries of all the tilings that lie inside the limits
+        k = np.arange(self.tiling_dims[0] + 2)
+        boundaries = (low + (k[np.newaxis, :] - offsets[:, np.newaxis]) / norm).ravel()
+        boundaries = boundaries[(boundaries > low) & (boundaries <= high)]
+        boundaries = np.unique([self._exact_boundary(b, 1e-9 * (high - low)) for b in boundaries])
+
+        # segment i starts at its left edge, so the greedy action there is
+        # the action of the whole segment
+        left_edges = np.concatenate(([low], boundaries))
+        indices = np.concatenate((self.tilecoder.getitems(left_edges),
+                                  np.full((len(left_edges), 1), self.num_features - 1)), axis=1)
+        weights_matrix = self.weights.reshape(self.num_actions, self.num_features)
+        actions = np.argmax(weights_matrix[:, indices].sum(axis=2), axis=0)
+
+        # only keep the boundaries where the action changes
+        changes = actions[1:] != actions[:-1]
+        return CompiledPolicy(breakpoints=boundaries[changes].tolist(),
+                              actions=[int(actions[0])] + actions[1:][changes].tolist())
+
+    def _exact_boundary(self, boundary, gap):
+        """
+        Returns the smallest float at which the tile coding changes near an
+        analytically computed tile boundary, which can be off by a few ulps,
+        by bisecting between two floats on either side of it.
+        """
+        low, high = boundary - gap, boundary + gap
+        below = self.tilecoder.getitem([low]).tolist()
+        while np.nextafter(low, high) < high:
+            mid = (low + high) / 2
+            if self.tilecoder.getitem([mid]).tolist() == below:
+                low = mid
+            else:
+                high = mid
+        return high
+
+    def verify_compiled_policy(self, policy, num_points=10001):
+        """
+        Checks the compiled policy against choose_action over a dense grid
+        spanning the limits, and right at and just below every breakpoint.
+        Returns the observations where they disagree.
+        """
+        low, high = self.limits_per_dim[0]
+        breakpoints = np.array(policy.breakpoints)
+        grid = np.concatenate((np.linspace(low, high, num_points),
+                               breakpoints, np.nextafter(breakpoints, -np.inf)))
+        mismatches = [x for x in grid.tolist()
+                      if policy.choose_action([x]) != self.choose_action([x])]
+        return mismatches
+
 
 if __name__ == '__main__':
     test_agent = InferenceAgent(weights_file_name='results/test/linear_deroller_fins_initroll_0.npy')
@@ -54,3 +135,7 @@ if __name__ == '__main__':
     obs = [2]
     action = test_agent.choose_action(obs)
     print(f'Rate of roll: {obs[0]}, Fin direction: {action}')
+
+    compiled_policy = test_agent.compile_policy()
+    mismatches = test_agent.verify_compiled_policy(compiled_policy)
+    print(f'Compiled policy: {len(compiled_policy.breakpoints)} breakpoints, {len(mismatches)} mismatches')
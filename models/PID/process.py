@@ -1,7 +1,7 @@
-import matplotlib.pyplot as plt
-import numpy as np
-
-from drag import Drag
+try:
+    from models.PID.drag import Drag
+except ImportError:     # when run as a script from this folder
+    from drag import Drag
 
 class Process:
     def __init__(self, physics: Drag):
@@ -71,6 +71,9 @@ class Process:
         return self.roll
     
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import numpy as np
+
     physics = Drag()
     ship = Process(physics)
 
@@ -0,0 +1,209 @@
+"""
+This file trains a CDiscQ agent offline from logged transitions.
+
+The transitions can come from the experiment logs written by experiment.py
+or from the hardware CSVs written by simpler_loop.py. The learned weights
+are saved in the same format as the experiment logs, so they can be loaded
+by get_weights_from_npy, InferenceAgent, and the 'weights_file' agent option.
+"""
+
+import os
+import math
+import time
+import argparse
+import numpy as np
+from utils.sweeper import Sweeper
+from utils.helpers import validate_output_folder
+from utils.stream_log import load_experiment_log
+from agent.algorithms import CDiscQAgent
+
+
+def load_transitions_from_log(filename):
+    """
+    Returns the (obs, action, reward, next_obs, term) transitions stored in
+    an experiment log, concatenated over all the runs.
+
+    The log stores the first observation and action of each run separately,
+    and then at each step t the reward, the *next* observation, the
+    termination flag, and the action taken in response to them. Streaming
+    logs (folders written with the 'stream' log_format) are read the same way.
+    """
+    if os.path.isdir(filename):
+        log = load_experiment_log(filename)
+    else:
+        log = np.load(filename, allow_pickle=True).item()
+    assert 'obs' in log, f'{filename} has no logged observations.'
+
+    actions = np.concatenate((log['start_action'][:, np.newaxis], log['action'][:, :-1]), axis=1)
+    transitions = (log['obs'][:, :-1], actions, log['reward'], log['obs'][:, 1:], log['term'])
+    return tuple(np.concatenate(x, axis=0) for x in transitions)
+
+
+def load_transitions_from_csv(filename, rate_scale=math.pi / 180):
+    """
+    Returns the transitions stored in a hardware CSV from simpler_loop.py.
+
+    Each row holds the time, roll angle, roll rate, and the discrete action
+    taken at that roll rate. The reward is the negative absolute value of
+    the next roll rate, as in RollingPayloadEnv.
+
+    Args:
+        filename: the path of the CSV file
+        rate_scale: multiplies the logged roll rate; the default converts
+                    degrees to radians, as expected by InferenceAgent
+    """
+    data = np.loadtxt(filename, delimiter=',', ndmin=2)
+    rates = data[:, 2] * rate_scale
+    actions = data[:, 3]
+    assert np.all(actions == np.round(actions)), 'only discrete actions can be used for training'
+
+    obs = rates[:-1, np.newaxis]
+    next_obs = rates[1:, np.newaxis]
+    rewards = -np.abs(rates[1:])
+    terms = np.zeros(len(obs), dtype=bool)
+    return obs, actions[:-1].astype(int), rewards, next_obs, terms
+
+
+def load_transitions(filenames):
+    """Loads and concatenates the transitions from all the given files."""
+    transitions = []
+    for filename in filenames:
+        if filename.endswith('.csv'):
+            transitions.append(load_transitions_from_csv(filename))
+        else:
+            transitions.append(load_transitions_from_log(filename))
+    return tuple(np.concatenate(x, axis=0) for x in zip(*transitions))
+
+
+def fitted_q_iteration(agent, obs, actions, rewards, next_obs, terms,
+                       num_iterations, ridge=1e-3):
+    """
+    Fits the agent's weights with fitted Q-iteration: each iteration computes
+    the CDiscQ targets for the whole dataset with the current weights and
+    solves one ridge regression per action.
+
+    Tile-coded features are one-hot rows with a few active indices, so their
+    normal equations are built and solved as sparse matrices, whose size
+    grows with the active indices instead of the square of num_features.
+    As in the agents' updates, the repeated (hashed) indices of a sample add up.
+
+    The reward rate is set to the dataset's average reward. It shifts all
+    the action values equally, so it does not affect the greedy policy.
+    """
+    if agent.tilecoder:
+        from scipy.sparse import csr_matrix, identity     # only needed for tile-coded features
+        from scipy.sparse.linalg import spsolve
+
+        num_samples, num_active = obs.shape
+        features = csr_matrix((np.ones(obs.size), obs.ravel(), np.arange(0, obs.size + 1, num_active)),
+                              shape=(num_samples, agent.num_features))
+        features.sum_duplicates()
+        regularizer = ridge * identity(agent.num_features, format='csr')
+
+        def solve(x, y):
+            return spsolve((x.T @ x + regularizer).tocsc(), x.T @ y)
+
+        def next_values():
+            return agent.weights_matrix[:, next_obs].sum(axis=2).max(axis=0)
+    else:
+        features = obs
+        regularizer = ridge * np.eye(agent.num_features)
+
+        def solve(x, y):
+            return np.linalg.solve(x.T @ x + regularizer, x.T @ y)
+
+        def next_values():
+            return (next_obs @ agent.weights_matrix.T).max(axis=1)
+
+    agent.avg_reward = rewards.mean()
+    rows_of_action = {a: np.flatnonzero(actions == a) for a in agent.actions}
+    for _ in range(num_iterations):
+        targets = rewards - agent.avg_reward + agent.gamma * np.where(terms, 0.0, next_values())
+        for a, rows in rows_of_action.items():
+            if len(rows) == 0:
+                continue
+            agent.weights_matrix[a] = solve(features[rows], targets[rows])
+
+
+def cdiscq_epochs(agent, obs, actions, rewards, next_obs, terms, num_iterations):
+    """
+    Trains the agent with full-batch CDiscQ updates: each epoch applies the
+    average update over the whole dataset at once, and then advances the
+    step sizes as one (greedy) online step would.
+    """
+    for _ in range(num_iterations):
+        deltas = agent._replay_update(obs, actions, rewards, next_obs, terms)
+        agent.avg_reward += agent.beta * deltas.mean()
+        agent.timestep += 1
+        agent.update_count += 1
+        agent._update_step_size()
+
+
+def train_offline(config, transitions):
+    """
+    Trains an agent on the given transitions for one parameter configuration.
+
+    Args:
+        config: a dictionary of the agent and training parameters
+        transitions: a tuple of (obs, actions, rewards, next_obs, terms) arrays
+    Returns:
+        log: a dictionary in the format of the experiment logs
+    """
+    method = config.get('offline_method', 'fitted_q')
+    assert method in ['fitted_q', 'cdiscq']
+    num_iterations = config.get('num_offline_iterations', 50 if method == 'fitted_q' else 1000)
+
+    agent = CDiscQAgent(**config)
+    agent._initialize_step_size()
+    raw_obs, actions, rewards, raw_next_obs, terms = transitions
+    obs = agent._process_raw_observations(raw_obs)
+    next_obs = agent._process_raw_observations(raw_next_obs)
+    actions = actions.astype(int)
+    rewards = rewards.astype(float)
+    terms = terms.astype(bool)
+
+    if method == 'fitted_q':
+        fitted_q_iteration(agent, obs, actions, rewards, next_obs, terms, num_iterations,
+                           ridge=config.get('ridge', 1e-3))
+    else:
+        cdiscq_epochs(agent, obs, actions, rewards, next_obs, terms, num_iterations)
+
+    log = {'weights_final': agent.weights[np.newaxis].astype(np.float32),
+           'avgrew_final': np.array([agent.avg_reward], dtype=np.float32),
+           }
+    return log
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train an agent offline from logged transitions")
+    parser.add_argument('--config-file', required=True,
+                        help='location of the config file for the agent (e.g., config_files/learned_controller.json)')
+    parser.add_argument('--data', nargs='+', required=True,
+                        help='experiment logs (.npy or streaming-log folders) or hardware logs (.csv) with the transitions')
+    parser.add_argument('--cfg-start', default=0)
+    parser.add_argument('--cfg-end', default=-1)
+    parser.add_argument('--output-path', default='results/offline/')
+    args = parser.parse_args()
+    path = validate_output_folder(args.output_path)
+
+    transitions = load_transitions(args.data)
+    print(f'Loaded {len(transitions[1])} transitions from {len(args.data)} file(s)')
+
+    sweeper = Sweeper(args.config_file)
+    cfg_start_idx = int(args.cfg_start)
+    cfg_end_idx = int(args.cfg_end) if int(args.cfg_end) != -1 else sweeper.total_combinations
+
+    start_time = time.time()
+    for i in range(cfg_start_idx, cfg_end_idx):
+        config = sweeper.get_one_config(i)
+        config['exp_id'] = i
+        config['output_folder'] = path
+        print(config)
+
+        log = train_offline(config, transitions)
+        log['params'] = config
+        filename = f"{config['exp_name']}_offline_{config['exp_id']}"
+        print(f'Saving offline-training log in: {filename}.npy\n')
+        np.save(f'{path}{filename}', log)
+
+    print("Total time elapsed: {:.2} minutes".format((time.time() - start_time) / 60))
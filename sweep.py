@@ -0,0 +1,108 @@
+"""
+This file runs a sweep with a pool of worker processes, each bound to its
+own KSP/kRPC endpoint or to a simulator.
+
+The workers take configurations from a work queue in the output folder as
+they become free, so the sweep spreads over however many game instances or
+cores there are, and slow configurations do not hold up the others. The
+queue records which configurations are done or failed; running the same
+command again after an interruption picks up the remaining ones, and the
+configurations of a worker that dies are picked up by the others. As in
+experiment.py, configurations identical to ones already in the output
+folder's result cache are not run again.
+
+The workers file is a JSON list with one dictionary per worker, whose
+entries override the experiment config for that worker, e.g.:
+
+    [{"krpc_address": "127.0.0.1", "krpc_rpc_port": 50000, "krpc_stream_port": 50001},
+     {"krpc_address": "127.0.0.1", "krpc_rpc_port": 50002, "krpc_stream_port": 50003}]
+
+Without a workers file, --num-workers workers run with the config as is
+(e.g., with a simulator environment).
+"""
+
+import json
+import time
+import argparse
+import multiprocessing
+from utils.sweeper import Sweeper
+from utils.helpers import validate_output_folder
+from utils.work_queue import WorkQueue
+from experiment import run_and_save_one_config
+
+
+def run_worker(worker, overrides, config_file, path, queue_file, use_cache=True, lease=None,
+               poll_interval=5.0):
+    """Runs configurations from the queue until there are none left."""
+    sweeper = Sweeper(config_file)
+    queue = WorkQueue(queue_file, lease=lease)
+    while True:
+        idx = queue.claim(worker)
+        if idx is None:
+            # the configurations still running are handed out again if their worker dies
+            if queue.counts()['running'] == 0:
+                return
+            time.sleep(poll_interval)
+            continue
+        config = sweeper.get_one_config(idx)
+        config.update(overrides)
+        config['exp_id'] = idx
+        config['output_folder'] = path
+        print(f'[{worker}] {config}')
+
+        error = run_and_save_one_config(config, path, use_cache=use_cache)
+        finished = queue.complete(idx, worker) if error is None else queue.fail(idx, worker, error)
+        if not finished:
+            print(f'[{worker}] configuration {idx} was handed out again before it finished')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a sweep with a pool of workers")
+    parser.add_argument('--config-file', required=True,
+                        help='location of the config file for the experiment (e.g., config_files/test_config.json)')
+    parser.add_argument('--workers', default=None,
+                        help='JSON file with the config overrides (e.g., the kRPC endpoint) of each worker')
+    parser.add_argument('--num-workers', type=int, default=1,
+                        help='number of workers when no workers file is given')
+    parser.add_argument('--cfg-start', type=int, default=0)
+    parser.add_argument('--cfg-end', type=int, default=-1)
+    parser.add_argument('--retry-failed', action='store_true', help='run the failed configurations again')
+    parser.add_argument('--lease', type=float, default=None,
+                        help='seconds after which a running configuration is handed out again '
+                             '(those of dead workers on this machine always are)')
+    parser.add_argument('--rerun', action='store_true',
+                        help='run the configurations even if identical ones have been run before')
+    parser.add_argument('--output-path', default='results/test_exp/')
+    args = parser.parse_args()
+    path = validate_output_folder(args.output_path)
+
+    if args.workers:
+        with open(args.workers) as f:
+            workers = json.load(f)
+    else:
+        workers = [{} for _ in range(args.num_workers)]
+
+    sweeper = Sweeper(args.config_file)
+    cfg_end_idx = args.cfg_end if args.cfg_end != -1 else sweeper.total_combinations
+    queue_file = f"{path}{sweeper.config_dict['exp_name']}_queue.json"
+    queue = WorkQueue(queue_file, lease=args.lease)
+    queue.initialize(range(args.cfg_start, cfg_end_idx), retry_failed=args.retry_failed)
+    print(f'\n\nRunning configurations {args.cfg_start} to {cfg_end_idx} with {len(workers)} workers: '
+          f'{queue.counts()}\n\n')
+
+    start_time = time.time()
+    processes = [multiprocessing.Process(target=run_worker,
+                                         args=(f'worker-{i}', overrides, args.config_file, path, queue_file,
+                                               not args.rerun, args.lease))
+                 for i, overrides in enumerate(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    print(f'\n\nSweep finished: {queue.counts()}')
+    print("Total time elapsed: {:.2} minutes".format((time.time() - start_time) / 60))
+
+
+if __name__ == '__main__':
+    main()
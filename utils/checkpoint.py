@@ -0,0 +1,29 @@
+"""Atomic checkpoints of a running experiment (agent, environment, and partial log)."""
+
+import os
+import pickle
+
+
+def save_checkpoint(filename, checkpoint):
+    """
+    Pickles the checkpoint to a temporary file and then renames it, so a
+    crash while saving leaves the previous checkpoint intact.
+    """
+    with open(filename + '.tmp', 'wb') as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(filename + '.tmp', filename)
+
+
+def load_checkpoint(filename):
+    """Returns the checkpoint saved in the file, or None if there is none."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def remove_checkpoint(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
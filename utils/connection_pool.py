@@ -0,0 +1,75 @@
+"""A pool of kRPC connections that are reused across runs and configurations."""
+
+import atexit
+import time
+
+
+class ConnectionPool:
+    """
+    Keeps one open connection per server endpoint.
+
+    get returns the pooled connection of an endpoint after checking that it
+    is still alive, and (re)connects if there is none or the check fails.
+    The check only happens in get: a connection that drops while it is in
+    use raises in its user, which has to call get again to reconnect (as
+    experiment.py does once per run). All the connections are closed when
+    the interpreter exits.
+    """
+
+    def __init__(self):
+        self.connections = {}
+        self.num_connects = 0
+        self.num_reconnects = 0
+        self.connect_time = 0.0
+        atexit.register(self.close)
+
+    def get(self, endpoint, connect):
+        """
+        Args:
+            endpoint: a hashable key of the server, e.g., (address, rpc_port, stream_port)
+            connect: a function without arguments that opens a new connection to it
+        Returns:
+            conn: an open connection to the endpoint
+        """
+        conn = self.connections.get(endpoint)
+        if conn is not None:
+            if self._is_alive(conn):
+                return conn
+            self.num_reconnects += 1
+            self._close(endpoint)
+
+        start_time = time.perf_counter()
+        conn = connect()
+        self.connect_time += time.perf_counter() - start_time
+        self.num_connects += 1
+        self.connections[endpoint] = conn
+        return conn
+
+    @staticmethod
+    def _is_alive(conn):
+        """Makes one cheap remote call; any error means the connection is unusable."""
+        try:
+            conn.krpc.get_status()
+        except Exception:
+            return False
+        return True
+
+    def _close(self, endpoint):
+        conn = self.connections.pop(endpoint)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Closes all the pooled connections."""
+        for endpoint in list(self.connections):
+            self._close(endpoint)
+
+    @property
+    def num_live(self):
+        return len(self.connections)
+
+    def summary(self):
+        return (f'live {self.num_live}, opened {self.num_connects}, '
+                f'reconnected {self.num_reconnects}, setup {self.connect_time:.3f} s')
@@ -33,6 +33,26 @@ def get_weights_from_npy(filename, seed_idx=-1):
     return weights
 
 
+def get_weights(filename, seed_idx=-1, mmap=False):
+    """
+    Returns the weights from either a weights file (see utils/weights_file.py)
+    or an npy experiment log.
+
+    Args:
+        filename: full path of the weights file or the npy file
+        seed_idx: for npy files, which seed's weights to return; -1 returns average over seeds
+        mmap: for weights files, memory-map the (read-only) weights instead of reading them
+    Returns:
+        weights: the weight vector
+    """
+    from utils.weights_file import is_weights_file, load_weights_file
+
+    if is_weights_file(filename):
+        weights, _ = load_weights_file(filename, mmap=mmap)
+        return weights
+    return get_weights_from_npy(filename, seed_idx=seed_idx)
+
+
 def get_centered_values(env, config):
     with open("environments/centered_values.json") as f:
         centered_values_all = json.load(f)
@@ -0,0 +1,34 @@
+"""
+A compiled lookup-table policy that only needs the Python standard library,
+so that loading and running it on the payload's computer is fast.
+"""
+
+import json
+from bisect import bisect_right
+
+
+class CompiledPolicy():
+    """
+    A greedy policy over a 1-D observation, compiled into sorted breakpoints
+    and one action per segment: actions[i] is taken for observations in
+    [breakpoints[i-1], breakpoints[i]). Choosing an action is a single bisect
+    in pure Python, without any NumPy calls.
+    """
+
+    def __init__(self, breakpoints, actions):
+        assert len(actions) == len(breakpoints) + 1
+        self.breakpoints = list(breakpoints)
+        self.actions = list(actions)
+
+    def choose_action(self, obs):
+        return self.actions[bisect_right(self.breakpoints, obs[0])]
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'breakpoints': self.breakpoints, 'actions': self.actions}, f)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            table = json.load(f)
+        return cls(breakpoints=table['breakpoints'], actions=table['actions'])
@@ -0,0 +1,58 @@
+"""A fixed-size replay buffer for the processed (e.g., tile-coded) transitions."""
+
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    A ring buffer of transitions stored in preallocated NumPy arrays.
+
+    Once the buffer is full, new transitions overwrite the oldest ones
+    (first-in, first-out).
+    """
+
+    def __init__(self, capacity, obs_size, obs_dtype=float):
+        """
+        Args:
+            capacity: the maximum number of transitions stored
+            obs_size: the length of a processed observation
+            obs_dtype: the dtype of a processed observation (int for tile indices)
+        """
+        assert capacity > 0
+        self.capacity = capacity
+        self.obs = np.zeros((capacity, obs_size), dtype=obs_dtype)
+        self.actions = np.zeros(capacity, dtype=int)
+        self.rewards = np.zeros(capacity)
+        self.next_obs = np.zeros((capacity, obs_size), dtype=obs_dtype)
+        self.terms = np.zeros(capacity, dtype=bool)
+
+        self.size = 0
+        self.position = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, obs, action, reward, next_obs, term):
+        """Stores a transition, evicting the oldest one if the buffer is full."""
+        i = self.position
+        self.obs[i] = obs
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_obs[i] = next_obs
+        self.terms[i] = term
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size, rng):
+        """
+        Returns a batch of transitions sampled uniformly with replacement.
+
+        Args:
+            batch_size: the number of transitions
+            rng: a numpy random-number generator
+        Returns:
+            (obs, actions, rewards, next_obs, terms) arrays with batch_size rows
+        """
+        idx = rng.integers(self.size, size=batch_size)
+        return self.obs[idx], self.actions[idx], self.rewards[idx], self.next_obs[idx], self.terms[idx]
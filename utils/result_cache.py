@@ -0,0 +1,48 @@
+"""
+An index of the finished experiment logs in an output folder, keyed by the
+canonical hash of their configuration (see utils.sweeper.config_hash).
+
+Reruns, overlapping sweeps, and sweeps restarted after a crash look their
+configurations up in the index and skip the ones that already have a log.
+"""
+
+import json
+import os
+from utils.sweeper import config_hash
+from utils.work_queue import FileLock
+
+
+class ResultCache:
+    def __init__(self, path, index_name='result_index.json'):
+        """
+        Args:
+            path: the output folder with the logs (ending with a separator)
+            index_name: the name of the index file in that folder
+        """
+        self.path = path
+        self.filename = path + index_name
+        self.lock = FileLock(self.filename + '.lock')
+
+    def _read(self):
+        if not os.path.exists(self.filename):
+            return {}
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def lookup(self, config):
+        """Returns the path of the log of an identical configuration, or None if there is none."""
+        entry = self._read().get(config_hash(config))
+        if entry is None or not os.path.exists(self.path + entry['file']):
+            return None
+        return self.path + entry['file']
+
+    def add(self, config, filename):
+        """Records the log (a file name in the output folder) of a finished configuration."""
+        with self.lock:
+            index = self._read()
+            index[config_hash(config)] = {'file': filename,
+                                          'exp_name': config.get('exp_name'),
+                                          'exp_id': config.get('exp_id')}
+            with open(self.filename + '.tmp', 'w') as f:
+                json.dump(index, f, indent=1)
+            os.replace(self.filename + '.tmp', self.filename)
@@ -0,0 +1,219 @@
+"""
+A SQLite catalog of the experiment logs in a results folder.
+
+Each log gets one row of the 'results' table, with its file, format, size
+and modification time, its summary statistics, and its flattened params
+as columns named 'p_<param>' (nested keys are joined with '.', and lists
+are stored as JSON text). experiment.py adds every log it saves, and
+scan brings the catalog up to date with a folder, only loading the logs
+that are new or have changed. For example, the best alpha for each eta:
+
+    SELECT p_eta, p_alpha, MAX(reward_last10) FROM results GROUP BY p_eta
+
+The 'fields' table locates the data of each field of a streaming log:
+the rows of run r start at byte offset + r * rows_per_run * row_bytes of
+its data_file (rows_per_run is NULL for the fields not written per run).
+The arrays of an .npy log are inside a pickle, which has no stable
+offsets, so only the file of such a log is recorded.
+
+Run it from the root of the repository to update a catalog and query it:
+
+    python -m utils.results_catalog results/test_exp/ [--query "SELECT ..."]
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+from utils.stream_log import load_experiment_log, read_manifest, experiment_rows_per_run
+
+
+CATALOG = 'results.sqlite'
+_summary_columns = {'file': 'TEXT PRIMARY KEY', 'format': 'TEXT', 'size': 'INTEGER', 'mtime': 'REAL',
+                    'num_runs': 'INTEGER', 'num_steps': 'INTEGER', 'reward_total': 'REAL',
+                    'reward_last50': 'REAL', 'reward_last10': 'REAL', 'avgrew_final': 'REAL'}
+_field_columns = {'file': 'TEXT', 'field': 'TEXT', 'data_file': 'TEXT', 'dtype': 'TEXT', 'shape': 'TEXT',
+                  'num_rows': 'INTEGER', 'offset': 'INTEGER', 'row_bytes': 'INTEGER',
+                  'rows_per_run': 'INTEGER'}
+
+
+def flatten_params(params, prefix='p_'):
+    """Flattens nested params into {'p_<key>[.<subkey>]': value}, with lists as JSON text."""
+    flat = {}
+    for key, value in params.items():
+        if isinstance(value, dict):
+            flat.update(flatten_params(value, f'{prefix}{key}.'))
+        elif isinstance(value, (list, tuple)):
+            flat[f'{prefix}{key}'] = json.dumps(value)
+        elif isinstance(value, (np.generic,)):
+            flat[f'{prefix}{key}'] = value.item()
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def summarize_log(log):
+    """Returns the summary statistics of an experiment log (as printed by experiment.py)."""
+    reward = np.asarray(log['reward'])
+    summary = {'num_runs': reward.shape[0], 'num_steps': reward.shape[1]}
+    if reward.size:
+        summary.update(reward_total=float(reward.mean()),
+                       reward_last50=float(reward[:, reward.shape[1] // 2:].mean()),
+                       reward_last10=float(reward[:, reward.shape[1] // 10 * 9:].mean()))
+    if 'avgrew_final' in log and len(log['avgrew_final']):
+        summary['avgrew_final'] = float(np.mean(log['avgrew_final']))
+    return summary
+
+
+def _load_log(filename):
+    if os.path.isdir(filename):
+        return load_experiment_log(filename, fields=['reward', 'avgrew_final', 'weights_final'])
+    return np.load(filename, allow_pickle=True).item()
+
+
+def stream_log_fields(folder):
+    """Returns the 'fields' rows of a streaming experiment log (see the module docstring)."""
+    manifest = read_manifest(folder)
+    file = os.path.basename(os.path.normpath(folder))
+    rows = []
+    for field, info in manifest['fields'].items():
+        row_bytes = int(np.dtype(info['dtype']).itemsize * np.prod(info['shape'], dtype=np.int64))
+        rows.append({'file': file, 'field': field, 'data_file': f'{field}.bin', 'dtype': info['dtype'],
+                     'shape': json.dumps(info['shape']), 'num_rows': info['num_rows'], 'offset': 0,
+                     'row_bytes': row_bytes,
+                     'rows_per_run': experiment_rows_per_run(field, manifest['metadata'])})
+    return rows
+
+
+class ResultsCatalog:
+    def __init__(self, filename, timeout=60.0):
+        """
+        Args:
+            filename: the SQLite file of the catalog
+            timeout: seconds to wait for a database locked by another process
+        """
+        self.filename = filename
+        # the workers of a sweep may add their results concurrently, so the
+        # transactions are explicit (see _transaction)
+        self.db = sqlite3.connect(filename, timeout=timeout, isolation_level=None)
+        self.db.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+        with self._transaction():
+            columns = ', '.join(f'"{name}" {sql_type}' for name, sql_type in _summary_columns.items())
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS results ({columns})')
+            columns = ', '.join(f'"{name}" {sql_type}' for name, sql_type in _field_columns.items())
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS fields ({columns}, PRIMARY KEY (file, field))')
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs a block in a transaction that takes the write lock up front, so
+        that no other process changes the schema between our reads and writes.
+        """
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def _columns(self):
+        return {row[1] for row in self.db.execute('PRAGMA table_info(results)')}
+
+    def add(self, filename, log=None, params=None):
+        """
+        Adds (or replaces) the row of a log, and the rows of its fields for a streaming log.
+
+        Args:
+            filename: the path of the log (a .npy file or a streaming-log folder)
+            log: the log, in the np.save layout (see load_experiment_log); loaded if not given
+            params: the params of the log; log['params'] by default
+        """
+        if log is None:
+            log = _load_log(filename)
+        stat = os.stat(filename)
+        is_stream = os.path.isdir(filename)
+        size = sum(entry.stat().st_size for entry in os.scandir(filename)) if is_stream else stat.st_size
+        row = {'file': os.path.basename(os.path.normpath(filename)),
+               'format': 'stream' if is_stream else 'npy',
+               'size': size, 'mtime': stat.st_mtime}
+        row.update(summarize_log(log))
+        row.update(flatten_params(params if params is not None else log.get('params', {})))
+        field_rows = stream_log_fields(filename) if is_stream else []
+
+        with self._transaction():
+            existing = self._columns()
+            for name, value in row.items():
+                if name not in existing:
+                    sql_type = 'REAL' if isinstance(value, (int, float)) and not isinstance(value, bool) else ''
+                    self.db.execute(f'ALTER TABLE results ADD COLUMN "{name}" {sql_type}')
+            self._insert('results', row)
+            self.db.execute('DELETE FROM fields WHERE file = ?', (row['file'],))
+            for field_row in field_rows:
+                self._insert('fields', field_row)
+
+    def _insert(self, table, row):
+        names = ', '.join(f'"{name}"' for name in row)
+        placeholders = ', '.join('?' for _ in row)
+        self.db.execute(f'INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})',
+                        list(row.values()))
+
+    def scan(self, folder):
+        """
+        Brings the catalog up to date with the logs in a folder: loads the
+        new or modified logs, and drops the rows of the logs that are gone.
+
+        Returns:
+            the number of logs that were (re)loaded
+        """
+        known = {file: mtime for file, mtime in self.db.execute('SELECT file, mtime FROM results')}
+        present = set()
+        num_loaded = 0
+        for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+            is_log = (entry.is_file() and entry.name.endswith('.npy')) or \
+                (entry.is_dir() and os.path.exists(os.path.join(entry.path, 'manifest.json')))
+            if not is_log:
+                continue
+            present.add(entry.name)
+            if known.get(entry.name) == entry.stat().st_mtime:
+                continue
+            try:
+                log = _load_log(entry.path)
+            except Exception as ex:
+                print(f'Skipping {entry.name}: {ex}')
+                continue
+            if not isinstance(log, dict) or 'reward' not in log:
+                continue
+            self.add(entry.path, log)
+            num_loaded += 1
+        with self._transaction():
+            for file in set(known) - present:
+                self.db.execute('DELETE FROM results WHERE file = ?', (file,))
+                self.db.execute('DELETE FROM fields WHERE file = ?', (file,))
+        return num_loaded
+
+    def query(self, sql, parameters=()):
+        """Returns the column names and the rows of a query."""
+        cursor = self.db.execute(sql, parameters)
+        return [column[0] for column in cursor.description], cursor.fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Update the results catalog of a folder and query it")
+    parser.add_argument('folder', help='the results folder')
+    parser.add_argument('--query', default='SELECT file, reward_last10 FROM results ORDER BY reward_last10 DESC')
+    args = parser.parse_args()
+
+    catalog = ResultsCatalog(os.path.join(args.folder, CATALOG))
+    print(f'Loaded {catalog.scan(args.folder)} new or modified logs')
+    columns, rows = catalog.query(args.query)
+    print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join(str(value) for value in row))
+    catalog.close()
@@ -0,0 +1,204 @@
+"""
+A log that streams fixed-size chunks of rows to one file per field.
+
+Each field is a column file of raw rows, which only ever grows, and a JSON
+manifest records the dtype, row shape, and number of rows of every field,
+along with any metadata (e.g., the experiment's parameters). Only the
+current chunk of each field is held in memory, so memory stays flat
+however long the run, and the rows flushed before a crash survive it.
+Any field can be memory-mapped on its own with load_stream_log.
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+
+
+MANIFEST = 'manifest.json'
+
+
+class _Column:
+    def __init__(self, filename, row_shape, dtype, chunk_size, num_rows=0):
+        self.filename = filename
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.empty((chunk_size,) + self.row_shape, dtype=self.dtype)
+        self.num_buffered = 0
+        self.num_rows = num_rows        # rows on disk
+
+    def append(self, value):
+        self.buffer[self.num_buffered] = value
+        self.num_buffered += 1
+        return self.num_buffered == len(self.buffer)
+
+    def flush(self):
+        if self.num_buffered:
+            with open(self.filename, 'ab') as f:
+                f.write(self.buffer[:self.num_buffered].tobytes())
+            self.num_rows += self.num_buffered
+            self.num_buffered = 0
+
+    def truncate(self):
+        """Drops the rows on disk beyond num_rows (e.g., written after a checkpoint)."""
+        with open(self.filename, 'r+b') as f:
+            f.truncate(self.num_rows * self.buffer[0].nbytes)
+
+
+class StreamingLog:
+    def __init__(self, folder, dtypes=None, chunk_size=4096, **metadata):
+        """
+        Args:
+            folder: the folder of the column files and the manifest
+            dtypes: the dtype of some fields; the others take the dtype of their first row
+            chunk_size: the number of rows of a field held in memory before they are written
+            **metadata: JSON-serializable metadata stored in the manifest
+        """
+        self.folder = os.path.join(folder, '')
+        self.dtypes = dtypes or {}
+        self.chunk_size = chunk_size
+        self.metadata = metadata
+        self.complete = False
+        self.columns = {}
+        os.makedirs(self.folder, exist_ok=True)
+        self._write_manifest()
+
+    def append(self, field, value):
+        """Appends one row to a field; the row shape of a new field is that of its first row."""
+        column = self.columns.get(field)
+        if column is None:
+            value = np.asarray(value, dtype=self.dtypes.get(field))
+            column = _Column(f'{self.folder}{field}.bin', value.shape, value.dtype, self.chunk_size)
+            # a new field starts from an empty file, even if an old run left one behind
+            open(column.filename, 'wb').close()
+            self.columns[field] = column
+        if column.append(value):
+            column.flush()
+            self._write_manifest()
+
+    def num_rows(self, field):
+        column = self.columns.get(field)
+        return 0 if column is None else column.num_rows + column.num_buffered
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self._write_manifest()
+
+    def close(self, **metadata):
+        """Writes the remaining rows and marks the log complete, with extra metadata."""
+        self.metadata.update(metadata)
+        self.complete = True
+        self.flush()
+
+    def _write_manifest(self):
+        manifest = {'complete': self.complete,
+                    'metadata': self.metadata,
+                    'fields': {field: {'dtype': column.dtype.str,
+                                       'shape': list(column.row_shape),
+                                       'num_rows': column.num_rows}
+                               for field, column in self.columns.items()},
+                    }
+        with open(self.folder + MANIFEST + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(self.folder + MANIFEST + '.tmp', self.folder + MANIFEST)
+
+    def __getstate__(self):
+        # e.g., for checkpoints: the state is the number of rows of each field
+        self.flush()
+        return {'folder': self.folder, 'dtypes': self.dtypes, 'chunk_size': self.chunk_size,
+                'metadata': self.metadata, 'complete': self.complete,
+                'fields': {field: (column.row_shape, column.dtype.str, column.num_rows)
+                           for field, column in self.columns.items()}}
+
+    def __setstate__(self, state):
+        # rows appended after the state was saved are dropped
+        fields = state.pop('fields')
+        self.__dict__.update(state)
+        self.columns = {}
+        for field, (row_shape, dtype, num_rows) in fields.items():
+            self.columns[field] = _Column(f'{self.folder}{field}.bin', row_shape, dtype,
+                                          self.chunk_size, num_rows)
+            self.columns[field].truncate()
+        self._write_manifest()
+
+
+def read_manifest(folder):
+    with open(os.path.join(folder, MANIFEST)) as f:
+        return json.load(f)
+
+
+def copy_stream_log(folder, new_folder, **metadata):
+    """Copies a streaming log to a new folder, updating the metadata of the copy."""
+    shutil.copytree(folder, new_folder, dirs_exist_ok=True)
+    manifest = read_manifest(new_folder)
+    manifest['metadata'].update(metadata)
+    with open(os.path.join(new_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_stream_log(folder, fields=None):
+    """
+    Memory-maps the rows of a streaming log recorded in its manifest.
+
+    Args:
+        folder: the folder of the log
+        fields: the fields to load; all of them by default
+    Returns:
+        columns: a dictionary of read-only [num_rows, *row_shape] arrays
+        manifest: the manifest of the log
+    """
+    manifest = read_manifest(folder)
+    columns = {}
+    for field, info in manifest['fields'].items():
+        if fields is not None and field not in fields:
+            continue
+        shape = (info['num_rows'],) + tuple(info['shape'])
+        if info['num_rows'] == 0:
+            columns[field] = np.empty(shape, dtype=info['dtype'])
+        else:
+            columns[field] = np.memmap(os.path.join(folder, f'{field}.bin'), dtype=info['dtype'],
+                                       mode='r', shape=shape)
+    return columns, manifest
+
+
+def experiment_rows_per_run(field, metadata):
+    """
+    Returns the number of rows a run adds to a field of a streaming
+    experiment log (as written by experiment.py), or None for the fields
+    that are not written per run (e.g., the resumes).
+    """
+    if field in ['reward', 'action', 'term', 'next_obs']:
+        return metadata['num_max_steps'] + 1
+    if field in ['weights', 'avgrew']:
+        return metadata['num_max_steps'] // metadata['eval_every_n_steps'] + 1
+    if field in ['resume_at', 'resume_obs']:
+        return None
+    return 1
+
+
+def load_experiment_log(folder, fields=None):
+    """
+    Loads a streaming experiment log (as written by experiment.py) in the
+    layout of the experiment logs saved with np.save, for the runs that
+    finished. The per-step fields are memory-mapped; 'obs' is assembled
+    from the first observation of each run and the next observations.
+    """
+    columns, manifest = load_stream_log(folder, fields)
+    metadata = manifest['metadata']
+    # the runs are written one after the other, and a run is finished once its final weights are
+    num_runs = manifest['fields'].get('weights_final', {}).get('num_rows', 0)
+
+    log = {'params': metadata.get('params', {})}
+    for field, column in columns.items():
+        num_rows = experiment_rows_per_run(field, metadata)
+        if num_rows is None:
+            # one row per resumed run, not per run
+            log[field] = column
+        elif num_rows == 1:
+            log[field] = column[:num_runs]
+        else:
+            log[field] = column[:num_runs * num_rows].reshape((num_runs, num_rows) + column.shape[1:])
+    if 'start_obs' in log and 'next_obs' in log:
+        log['obs'] = np.concatenate((log['start_obs'][:, np.newaxis], log['next_obs']), axis=1)
+    return log
@@ -1,7 +1,23 @@
 # Based on the sweeper.py file in
 # https://github.com/muhammadzaheer/classic-control/blob/0f075ee2951de01d063bc1d069b28bf25167af20/sweeper.py
-import copy
 import json
+import hashlib
+
+
+# keys that say where or how a configuration runs, but not what it computes
+_non_result_keys = ['exp_name', 'exp_id', 'output_folder', 'rng_seed',
+                    'krpc_address', 'krpc_rpc_port', 'krpc_stream_port']
+
+
+def config_hash(config):
+    """
+    Returns a canonical hash of a configuration: configurations with the
+    same parameters have the same hash, whatever the order of their keys,
+    their experiment name and sweep index, or the endpoint they run on.
+    """
+    params = {key: value for key, value in config.items() if key not in _non_result_keys}
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
 
 
 class Sweeper:
@@ -15,23 +31,36 @@ class Sweeper:
             self.config_dict = json.load(f)
         self.total_combinations = 1
 
-        sweep_params = self.config_dict['sweep_parameters']
+        # the fixed parameters are shared by all the configurations
+        self.base_config = {key: value for key, value in self.config_dict.items()
+                            if key != 'sweep_parameters'}
+        self.sweep_params = list(self.config_dict['sweep_parameters'].items())
         # calculating total_combinations
         tc = 1
-        for params, values in sweep_params.items():
+        for params, values in self.sweep_params:
             tc = tc * len(values)
         self.total_combinations = tc
 
     def get_one_config(self, idx):
-        """replaces the range of values by a single value based on the index idx"""
-        cfg = copy.deepcopy(self.config_dict)
-        sweep_params = cfg.pop('sweep_parameters')
+        """
+        replaces the range of values by a single value based on the index idx
+
+        The configuration is a shallow copy of the fixed parameters, so its
+        nested values (e.g., limits_per_dim) must not be modified in place.
+        """
+        cfg = dict(self.base_config)
         cumulative = 1
-        for param, values in sweep_params.items():
+        for param, values in self.sweep_params:
             cfg[param] = values[int(idx/cumulative) % len(values)]
             cumulative *= len(values)
         return cfg
 
+    def iter_configs(self, start=0, end=None):
+        """Yields (idx, config) for the configurations from start to end, one at a time."""
+        end = self.total_combinations if end is None else end
+        for idx in range(start, end):
+            yield idx, self.get_one_config(idx)
+
 
 if __name__ == '__main__':
     sweeper = Sweeper("../config_files/test_config_prediction.json")
@@ -12,7 +12,9 @@ class TileCoder:
                  num_tilings: int,
                  wrap: Optional[Sequence[bool]] = None,
                  offset=lambda n: 2 * np.arange(n) + 1,
-                 style="indices"):
+                 style="indices",
+                 memory_size: Optional[int] = None,
+                 track_collisions: bool = False):
 
         # check style
         assert style in ["indices", "vector"]
@@ -29,7 +31,7 @@ class TileCoder:
         else:
             wrap = ~np.array(wrap, dtype=bool)
         self.wrap = not bool(wrap.sum())
-        self.tiling_dims = np.array(tiling_dims, dtype=np.int) + wrap
+        self.tiling_dims = np.array(tiling_dims, dtype=int) + wrap
 
         # displacement matrix; default is assymetric displacement a la Parks
         # and Militzer https://doi.org/10.1016/S1474-6670(17)54222-6
@@ -47,10 +49,58 @@ class TileCoder:
         # the total number of indices needed
         self._n_tiles = num_tilings * np.prod(self.tiling_dims)
 
+        # with a memory budget, the tile indices are hashed into a fixed
+        # number of slots; when collisions are tracked, the owner of each slot
+        # is the first tile that landed in it, which lets us count how often
+        # different tiles collide (e.g., for the lookups of a training run only)
+        self.hashed = memory_size is not None
+        self.track_collisions = self.hashed and track_collisions
+        if self.hashed:
+            assert memory_size > 0
+            self._n_tiles = memory_size
+            self._num_lookups = 0
+            self._num_collisions = 0
+            if self.track_collisions:
+                self._slot_owner = np.full(memory_size, -1, dtype=np.int64)
+
     @property
     def n_tiles(self):
         return self._n_tiles
 
+    @property
+    def collision_rate(self):
+        """
+        The fraction of tracked tile lookups that shared a slot with a
+        different tile; None if collisions are not tracked (or nothing was
+        looked up yet), since the rate is then unknown.
+        """
+        if not self.track_collisions or self._num_lookups == 0:
+            return None
+        return self._num_collisions / self._num_lookups
+
+    def _hash(self, ones):
+        """
+        Maps unhashed tile indices to memory slots: the indices are mixed
+        with the splitmix64 finalizer (two multiply-xorshift rounds) before
+        being reduced modulo the number of slots, so indices that are
+        congruent modulo the number of slots do not collide systematically.
+        """
+        z = ones.astype(np.uint64)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        z ^= z >> np.uint64(31)
+        slots = (z % np.uint64(self._n_tiles)).astype(np.int64)
+
+        if self.track_collisions:
+            # claim the free slots first, so that two different tiles landing in
+            # the same free slot within one call are also counted as a collision
+            free = self._slot_owner[slots] == -1
+            self._slot_owner[slots[free]] = ones[free]
+            self._num_lookups += ones.size
+            self._num_collisions += np.count_nonzero(self._slot_owner[slots] != ones)
+
+        return slots
+
     def getitem(self, x):
 
         if self.wrap:
@@ -66,6 +116,8 @@ class TileCoder:
                            + self._offsets)).astype(int)
 
         ones = self._tiling_loc + np.dot(off_coords, self._tile_loc)
+        if self.hashed:
+            ones = self._hash(ones)
 
         if self.style == "indices":
             return ones
@@ -75,6 +127,39 @@ class TileCoder:
 
             return vec
 
+    def getitems(self, xs):
+        """Tile-codes a batch of observations in one vectorized pass.
+
+        Args:
+            xs: an array-like of shape (N, d) with one observation per row
+        Returns:
+            an (N, num_tilings) matrix of indices for the 'indices' style, or
+            a sparse (N, n_tiles) CSR matrix for the 'vector' style
+        """
+        xs = np.asarray(xs, dtype=float).reshape(-1, len(self._tile_loc))
+
+        # (N, 1, d) against (num_tilings, d) broadcasts to (N, num_tilings, d)
+        coords = ((xs[:, np.newaxis, :] - self._limits[:, 0])
+                  * self._norm_dims
+                  + self._offsets)
+        if self.wrap:
+            coords %= self.tiling_dims
+        off_coords = coords.astype(int)
+
+        ones = self._tiling_loc + off_coords @ self._tile_loc
+        if self.hashed:
+            ones = self._hash(ones)
+
+        if self.style == "indices":
+            return ones
+        else:
+            from scipy.sparse import csr_matrix     # only needed for this style
+
+            num_rows, num_tilings = ones.shape
+            return csr_matrix((np.ones(ones.size), ones.ravel(),
+                               np.arange(0, ones.size + 1, num_tilings)),
+                              shape=(num_rows, self._n_tiles))
+
 
 def test_tilecoder():
     tc = TileCoder(tiling_dims=[2, 2], limits_per_dim=[[0, 1], [0, 1]], num_tilings=4, style='vector')
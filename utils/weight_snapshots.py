@@ -0,0 +1,124 @@
+"""
+Periodic weight snapshots stored as a base vector plus sparse deltas.
+
+A tile-coded agent only changes the few weights of the tiles it visited
+between two snapshots, so each snapshot after the first one is stored as
+the (index, value) pairs of the weights that changed since the previous
+snapshot. The weights are compared as float32, so the reconstructed
+snapshots are identical to the float32 snapshots of a dense log.
+"""
+
+import numpy as np
+
+
+class SparseSnapshots:
+    def __init__(self, num_weights, dtype=np.float32):
+        self.num_weights = num_weights
+        self.dtype = np.dtype(dtype)
+        self.base = None
+        self._last = None
+        self._indices = []
+        self._values = []
+        # the concatenated deltas, built on demand and dropped by append
+        self._consolidated = None
+
+    def __len__(self):
+        return 0 if self.base is None else len(self._indices) + 1
+
+    def append(self, weights):
+        """Takes a snapshot of the weights."""
+        weights = np.asarray(weights, dtype=self.dtype)
+        if self.base is None:
+            self.base = weights.copy()
+            self._last = weights.copy()
+            return
+        changed = np.flatnonzero(weights != self._last)
+        self._indices.append(changed.astype(np.int32))
+        self._values.append(weights[changed])
+        self._last[changed] = weights[changed]
+        self._consolidated = None
+
+    def _consolidate(self):
+        if self._consolidated is None:
+            if self._indices:
+                indices, values = np.concatenate(self._indices), np.concatenate(self._values)
+            else:
+                indices, values = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=self.dtype)
+            offsets = np.concatenate(([0], np.cumsum([len(x) for x in self._indices], dtype=np.int64)))
+            self._consolidated = indices, values, offsets
+        return self._consolidated
+
+    @property
+    def indices(self):
+        return self._consolidate()[0]
+
+    @property
+    def values(self):
+        return self._consolidate()[1]
+
+    @property
+    def offsets(self):
+        """offsets[k] is the end of the deltas of snapshot k in indices and values (offsets[0] = 0)."""
+        return self._consolidate()[2]
+
+    def to_dict(self):
+        """Returns the snapshots as a dictionary of plain arrays, e.g., for a log saved with np.save."""
+        return {'base': self.base, 'indices': self.indices, 'values': self.values, 'offsets': self.offsets}
+
+    @classmethod
+    def from_dict(cls, arrays):
+        snapshots = cls(len(arrays['base']), arrays['base'].dtype)
+        snapshots.base = np.asarray(arrays['base'])
+        offsets = arrays['offsets']
+        snapshots._indices = np.split(arrays['indices'], offsets[1:-1])
+        snapshots._values = np.split(arrays['values'], offsets[1:-1])
+        if len(offsets) == 1:           # only the base snapshot
+            snapshots._indices, snapshots._values = [], []
+        snapshots._last = snapshots[len(snapshots) - 1]
+        return snapshots
+
+    def __getitem__(self, k):
+        """
+        Reconstructs snapshot k by applying the deltas up to it to the base,
+        in order; iterating reconstructs all the snapshots in one pass.
+        """
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('snapshot index out of range')
+        weights = self.base.copy()
+        for indices, values in zip(self._indices[:k], self._values[:k]):
+            weights[indices] = values
+        return weights
+
+    def __iter__(self):
+        """Reconstructs the snapshots one after the other, applying each delta once."""
+        if self.base is None:
+            return
+        weights = self.base.copy()
+        yield weights.copy()
+        for indices, values in zip(self._indices, self._values):
+            weights[indices] = values
+            yield weights.copy()
+
+    def to_dense(self):
+        """
+        Reconstructs all the snapshots at once, as a [num_snapshots, num_weights]
+        array: each row is the previous one with its deltas scattered in, so
+        nothing is allocated besides the output.
+        """
+        dense = np.empty((len(self), self.num_weights), dtype=self.dtype)
+        if self.base is None:
+            return dense
+        dense[0] = self.base
+        for k, (indices, values) in enumerate(zip(self._indices, self._values), start=1):
+            dense[k] = dense[k - 1]
+            dense[k, indices] = values
+        return dense
+
+
+def dense_weight_snapshots(log):
+    """Returns the [num_runs, num_snapshots, num_weights] weight snapshots of a log, in either format."""
+    if 'weights_sparse' in log:
+        return np.stack([SparseSnapshots.from_dict(arrays).to_dense() for arrays in log['weights_sparse']])
+    return log['weights']
@@ -0,0 +1,162 @@
+"""
+A compact, pickle-free file format for a single weight vector.
+
+Layout (all integers little-endian):
+    magic      4 bytes     b'PLWT'
+    version    uint16
+    reserved   uint16
+    header_len uint32      length of the JSON header in bytes
+    header     header_len  UTF-8 JSON: tile-coder parameters, 'count',
+                           'dtype' and the CRC32 'checksum' of the data
+    padding                zeros up to a multiple of DATA_ALIGNMENT bytes
+    data       count * 4   raw float32 weights
+
+The data can be memory-mapped straight from disk or read from any buffer.
+"""
+
+import json
+import struct
+import zlib
+import numpy as np
+
+
+MAGIC = b'PLWT'
+VERSION = 1
+DATA_ALIGNMENT = 64
+DTYPE = '<f4'
+_PREFIX = struct.Struct('<4sHHI')
+
+
+def is_weights_file(filename):
+    """Returns True if the file starts with the magic bytes of this format."""
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_weights_file(filename, weights, **params):
+    """
+    Writes a weight vector and its parameters (e.g., the tile-coder
+    parameters) to a weights file.
+
+    Args:
+        filename: the path of the file
+        weights: the weight vector; it is stored as float32
+        **params: JSON-serializable parameters stored in the header
+    """
+    data = np.ascontiguousarray(weights, dtype=DTYPE).ravel()
+    header = dict(params, count=int(data.size), dtype=DTYPE,
+                  checksum=zlib.crc32(data.tobytes()))
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+
+    data_offset = _PREFIX.size + len(header_bytes)
+    padding = -data_offset % DATA_ALIGNMENT
+    with open(filename, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * padding)
+        f.write(data.tobytes())
+
+
+def _parse_prefix(prefix_bytes):
+    magic, version, _, header_len = _PREFIX.unpack(prefix_bytes)
+    assert magic == MAGIC, 'not a weights file'
+    assert version == VERSION, f'unsupported weights-file version {version}'
+    return header_len
+
+
+def read_header(filename):
+    """Returns the header of a weights file and the offset of its data."""
+    with open(filename, 'rb') as f:
+        header_len = _parse_prefix(f.read(_PREFIX.size))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    data_offset = _PREFIX.size + header_len
+    data_offset += -data_offset % DATA_ALIGNMENT
+    return header, data_offset
+
+
+def _check(weights, header, verify):
+    assert weights.size == header['count']
+    if verify:
+        assert zlib.crc32(weights.tobytes()) == header['checksum'], 'weights-file checksum mismatch'
+
+
+def check_header(header, **params):
+    """
+    Asserts that the parameters stored in the header of a weights file match
+    the given ones (e.g., an agent's tile-coder parameters). A parameter
+    missing from the header is not checked, except memory_size, which is
+    None (no hashing) when missing.
+    """
+    for key, value in params.items():
+        if key not in header and key != 'memory_size':
+            continue
+        stored = header.get(key)
+        assert np.asarray(stored).tolist() == np.asarray(value).tolist(), \
+            f'the weights file has {key}={stored}, but {value} was expected'
+
+
+def load_weights_file(filename, mmap=True, verify=True):
+    """
+    Loads the weights and the header of a weights file.
+
+    Args:
+        filename: the path of the file
+        mmap: memory-map the (read-only) weights instead of reading them
+        verify: check the CRC32 checksum of the weights
+    Returns:
+        weights: a float32 array of the weights
+        header: a dictionary of the parameters stored with the weights
+    """
+    header, data_offset = read_header(filename)
+    if mmap:
+        weights = np.memmap(filename, dtype=header['dtype'], mode='r',
+                            offset=data_offset, shape=(header['count'],))
+    else:
+        with open(filename, 'rb') as f:
+            f.seek(data_offset)
+            weights = np.fromfile(f, dtype=header['dtype'], count=header['count'])
+    _check(weights, header, verify)
+    return weights, header
+
+
+def load_weights_buffer(buffer, verify=True):
+    """Same as load_weights_file, but for the bytes of a weights file already in memory."""
+    buffer = memoryview(buffer)
+    header_len = _parse_prefix(buffer[:_PREFIX.size])
+    header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_len]).decode('utf-8'))
+    data_offset = _PREFIX.size + header_len
+    data_offset += -data_offset % DATA_ALIGNMENT
+    weights = np.frombuffer(buffer, dtype=header['dtype'], count=header['count'], offset=data_offset)
+    _check(weights, header, verify)
+    return weights, header
+
+
+def convert_log_to_weights_file(log_filename, filename, seed_idx=-1):
+    """
+    Converts the final weights in an experiment log (as saved by experiment.py)
+    to a weights file, with the agent's tile-coder parameters in the header.
+    """
+    log = np.load(log_filename, allow_pickle=True).item()
+    if seed_idx == -1:
+        weights = np.mean(log['weights_final'], axis=0)
+    else:
+        weights = log['weights_final'][seed_idx]
+    params = log.get('params', {})
+    header_keys = ['num_actions', 'tilecoder', 'num_tilings', 'tiling_dims',
+                   'limits_per_dim', 'memory_size', 'approximation_type']
+    save_weights_file(filename, weights,
+                      **{key: params[key] for key in header_keys if key in params})
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert an experiment log to a weights file")
+    parser.add_argument('log_file', help='the experiment log (.npy) with the final weights')
+    parser.add_argument('weights_file', help='the weights file to write')
+    parser.add_argument('--seed-idx', type=int, default=-1,
+                        help="which run's weights to convert; -1 averages over the runs")
+    args = parser.parse_args()
+    convert_log_to_weights_file(args.log_file, args.weights_file, seed_idx=args.seed_idx)
+    header, _ = read_header(args.weights_file)
+    print(f'Wrote {header["count"]} weights to {args.weights_file}')
@@ -0,0 +1,191 @@
+"""
+A queue of sweep configurations shared by worker processes through a file.
+
+The state of every configuration index (pending, running, done or failed)
+is kept in a JSON file, which the workers read and rewrite under a lock
+file. The lock is an exclusively-created file, so it works across
+processes and operating systems without extra dependencies.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+
+
+def _is_process_alive(pid):
+    """Returns whether a process of this machine is running."""
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)       # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259                           # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FileLock:
+    """
+    A lock held by whoever managed to create the lock file. The file holds
+    a token of its holder, so a holder whose lock was broken as stale (and
+    taken by another process) does not remove the new holder's lock.
+    """
+
+    def __init__(self, filename, stale_after=60.0, poll_interval=0.01):
+        """
+        Args:
+            filename: the path of the lock file
+            stale_after: seconds after which a left-over lock (e.g., of a killed worker) is broken
+            poll_interval: seconds between attempts to take the lock
+        """
+        self.filename = filename
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+
+    def __enter__(self):
+        token = f'{os.getpid()}:{uuid.uuid4().hex}'
+        while True:
+            try:
+                fd = os.open(self.filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, token.encode())
+                os.close(fd)
+                self.token = token
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.filename) > self.stale_after:
+                        os.remove(self.filename)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(self.poll_interval)
+
+    def __exit__(self, *exc_info):
+        try:
+            with open(self.filename) as f:
+                is_ours = f.read() == self.token
+            if is_ours:
+                os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+
+class WorkQueue:
+    """
+    Hands out configuration indices to workers, one at a time.
+
+    Every index is 'pending', 'running' (claimed by a worker), 'done' or
+    'failed'. Workers claim the next pending index when they are ready for
+    more work, so slow configurations do not hold up the others. A running
+    index is pending again once its worker's process is gone (e.g., it was
+    killed), or, if a lease is set, once it has been running for longer.
+    """
+
+    def __init__(self, filename, lease=None):
+        """
+        Args:
+            filename: the path of the queue file
+            lease: seconds after which a running index is handed out again; None for no limit
+        """
+        self.filename = filename
+        self.lease = lease
+        self.lock = FileLock(filename + '.lock')
+
+    def _read(self):
+        if not os.path.exists(self.filename):
+            return {}
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def _write(self, state):
+        # written to a temporary file first, so a crash never leaves a partial queue
+        with open(self.filename + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(self.filename + '.tmp', self.filename)
+
+    def initialize(self, indices, retry_failed=False):
+        """
+        Adds the indices that are not in the queue yet as pending. Indices
+        left running by a previous, interrupted sweep are pending again, and
+        so are the failed ones if retry_failed is set.
+        """
+        with self.lock:
+            state = self._read()
+            for idx in indices:
+                entry = state.get(str(idx))
+                if entry is None or entry['status'] == 'running' or \
+                        (retry_failed and entry['status'] == 'failed'):
+                    state[str(idx)] = {'status': 'pending'}
+            self._write(state)
+
+    def _is_abandoned(self, entry):
+        """Returns whether a running entry's worker is gone or its lease has expired."""
+        if self.lease is not None and time.time() - entry['start_time'] > self.lease:
+            return True
+        # only the processes of this machine can be checked
+        return entry.get('host') == socket.gethostname() and 'pid' in entry \
+            and not _is_process_alive(entry['pid'])
+
+    def claim(self, worker):
+        """
+        Marks the lowest pending index as running by the worker (in this
+        process) and returns it, or None if there is none. The abandoned
+        running indices are pending again first.
+        """
+        with self.lock:
+            state = self._read()
+            for idx, entry in state.items():
+                if entry['status'] == 'running' and self._is_abandoned(entry):
+                    state[idx] = {'status': 'pending', 'num_reclaims': entry.get('num_reclaims', 0) + 1}
+            pending = [int(idx) for idx, entry in state.items() if entry['status'] == 'pending']
+            if not pending:
+                self._write(state)
+                return None
+            idx = min(pending)
+            state[str(idx)] = {'status': 'running', 'worker': worker, 'start_time': time.time(),
+                               'host': socket.gethostname(), 'pid': os.getpid(),
+                               'num_reclaims': state[str(idx)].get('num_reclaims', 0)}
+            self._write(state)
+        return idx
+
+    def _finish(self, idx, worker, status, **info):
+        """
+        Marks an index claimed by the worker (in this process) as finished.
+        Returns False, and leaves the entry as is, if the index has been
+        handed out again since (e.g., its lease expired).
+        """
+        with self.lock:
+            state = self._read()
+            entry = state[str(idx)]
+            if entry['status'] != 'running' or entry.get('worker') != worker or \
+                    entry.get('pid') != os.getpid() or entry.get('host') != socket.gethostname():
+                return False
+            entry.update(info, status=status, end_time=time.time())
+            self._write(state)
+        return True
+
+    def complete(self, idx, worker):
+        return self._finish(idx, worker, 'done')
+
+    def fail(self, idx, worker, error):
+        return self._finish(idx, worker, 'failed', error=error)
+
+    def counts(self):
+        """Returns the number of indices in each status."""
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        with self.lock:
+            for entry in self._read().values():
+                counts[entry['status']] += 1
+        return counts